@@ -0,0 +1,272 @@
+import sys
+import json
+import shutil
+import time
+import logging
+import platform
+import tracemalloc
+import subprocess
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from argparse import ArgumentParser
+from typing import Callable, Dict, List
+
+from src.paths import BENCHMARKS_DIR, SHARED_FEATURES_DIR
+from src.logger import get_console_logger
+from src.miscellaneous import get_closing_price_columns
+from src.feature_pipeline.feature_engineering import FeatureAssembler
+from src.feature_pipeline.synthetic_data import generate_pair_ohlc
+from src.feature_pipeline.data_transformations import transform_ts_data_into_features_and_target, get_preprocessing_pipeline
+
+
+# A logger of our own, so that the benchmarks' progress can be shown while the pipeline's is silenced
+logger = get_console_logger(name="benchmarks")
+
+TRADING_DAYS_PER_YEAR = 260
+
+STAGES = ["windows", "preprocessing", "rsi", "ema", "objective"]
+
+
+def make_random_walks(years: int, pairs: int, seed: int = 0) -> Dict[str, pd.DataFrame]:
+
+    """
+    Returns:
+        Dict[str, pd.DataFrame]: synthetic OHLC data for each (made up) pair, in the form
+                                 that update_ohlc returns. There are no gaps, so that
+                                 every run of a given size has the same number of rows.
+    """
+
+    dates = pd.bdate_range("2000-01-03", periods=years*TRADING_DAYS_PER_YEAR)
+
+    return {
+        pair: generate_pair_ohlc(pair=pair, dates=dates, seed=seed, gap_probability=0)
+        for pair in [f"P{i:02d}GHS" if i < 100 else f"{i:03d}GHS" for i in range(pairs)]
+    }
+
+
+def measure(function: Callable[[], object], rows: int, repeats: int) -> dict:
+
+    """
+    Time the function (taking the best of several runs, as the others only add noise
+    from the rest of the machine), and then measure its peak memory in a run of its own,
+    as tracing the allocations slows it down.
+    """
+
+    timings = []
+
+    for _ in range(repeats):
+
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(timings)
+
+    return {
+        "rows": rows,
+        "wall_time_seconds": best,
+        "median_wall_time_seconds": float(np.median(timings)),
+        "peak_memory_mb": peak/1024**2,
+        "rows_per_second": rows/best if best > 0 else float("inf")
+    }
+
+
+def make_stage(stage: str, walks: Dict[str, pd.DataFrame]) -> Callable[[], object]:
+
+    """
+    Returns:
+        Callable[[], object]: runs the stage over the data of every pair.
+    """
+
+    pairs = list(walks)
+
+    windows = {
+        pair: transform_ts_data_into_features_and_target(
+            original_data=walks[pair], base_currency=pair[:3], target_currency=pair[3:]
+        )
+        for pair in pairs
+    } if stage in ["preprocessing", "rsi", "ema", "objective"] else None
+
+    if stage == "windows":
+
+        return lambda: [
+            transform_ts_data_into_features_and_target(original_data=walks[pair], base_currency=pair[:3], target_currency=pair[3:])
+            for pair in pairs
+        ]
+
+    elif stage == "preprocessing":
+
+        return lambda: [get_preprocessing_pipeline().fit_transform(windows[pair][0]) for pair in pairs]
+
+    elif stage in ["rsi", "ema"]:
+
+        # The indicator step of the pipeline's FeatureAssembler, on the closing rates of the windows
+        assembler = FeatureAssembler(rsi_length=14, ema_length=14)
+        compute_indicator = assembler.compute_rsi if stage == "rsi" else assembler.compute_ema
+
+        closing_rates = {
+            pair: features[get_closing_price_columns(data=features)].to_numpy(dtype=np.float32)
+            for pair, (features, _) in windows.items()
+        }
+
+        return lambda: [compute_indicator(windows=closing_rates[pair]) for pair in pairs]
+
+    elif stage == "objective":
+
+        import optuna
+        from sklearn.linear_model import Lasso
+        from src.training_pipeline.feature_cache import FeatureCache
+        from src.training_pipeline.shared_features import SharedFeatures
+        from src.training_pipeline.hyperparameter_tuning import make_objective
+
+        # One trial on the windows of all the pairs (pooled, as in chunked_training)
+        X = pd.concat(
+            [features.set_axis([column.replace(f"_{pair}", "") for column in features.columns], axis=1) for pair, (features, _) in windows.items()],
+            ignore_index=True
+        )
+
+        y = pd.concat([target.iloc[:, 0] for _, target in windows.values()], ignore_index=True)
+
+        shared_features = SharedFeatures.write(X=X, y=y, name="benchmark")
+        trial = optuna.trial.FixedTrial({"rsi_length": 14, "ema_length": 14, "alpha": 0.1})
+
+        # A new feature cache each time, so that the preprocessing of the folds is timed as well
+        return lambda: make_objective(
+            model_fn=Lasso, shared_features=shared_features, feature_cache=FeatureCache()
+        )(trial)
+
+    else:
+        raise NotImplementedError(f"There is no {stage} stage")
+
+
+def get_environment() -> dict:
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+
+    except OSError:
+        commit = None
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__
+    }
+
+
+def run_benchmarks(
+    stages: List[str] = STAGES,
+    years: List[int] = [1, 10, 50],
+    pairs: List[int] = [1, 10, 100],
+    repeats: int = 3
+) -> dict:
+
+    """
+    Run each stage on every combination of the numbers of years (of daily data) and pairs.
+
+    Returns:
+        dict: the environment, and the wall time, peak memory and rows per second of each run.
+    """
+
+    results = []
+
+    for number_of_years in years:
+        for number_of_pairs in pairs:
+
+            walks = make_random_walks(years=number_of_years, pairs=number_of_pairs)
+            rows = number_of_years*TRADING_DAYS_PER_YEAR*number_of_pairs
+
+            for stage in stages:
+
+                logger.info(f"{stage}: {number_of_years} year(s), {number_of_pairs} pair(s)")
+
+                result = measure(function=make_stage(stage=stage, walks=walks), rows=rows, repeats=repeats)
+                results.append({"stage": stage, "years": number_of_years, "pairs": number_of_pairs, **result})
+
+    # Written by the objective stage
+    shutil.rmtree(SHARED_FEATURES_DIR/"benchmark", ignore_errors=True)
+
+    return {"environment": get_environment(), "results": results}
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float = 0.2) -> List[dict]:
+
+    """
+    Match each run with the baseline's run of the same stage and size.
+
+    Args:
+        tolerance: how much slower (or hungrier for memory) a run may be than the
+                   baseline, as a fraction of the baseline, before it counts as a regression.
+
+    Returns:
+        List[dict]: the runs that regressed.
+    """
+
+    baseline_runs = {(run["stage"], run["years"], run["pairs"]): run for run in baseline["results"]}
+    regressions = []
+
+    for run in results["results"]:
+
+        baseline_run = baseline_runs.get((run["stage"], run["years"], run["pairs"]))
+
+        if baseline_run is None:
+            continue
+
+        for metric in ["wall_time_seconds", "peak_memory_mb"]:
+
+            ratio = run[metric]/baseline_run[metric] if baseline_run[metric] > 0 else 1.0
+
+            logger.info(f"{run['stage']:>13} {run['years']:>3}y {run['pairs']:>4} pair(s) {metric:>18}: {ratio:6.2f}x the baseline")
+
+            if ratio > 1 + tolerance:
+
+                regressions.append(
+                    {**{key: run[key] for key in ["stage", "years", "pairs"]}, "metric": metric, "ratio": ratio}
+                )
+
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser()
+
+    parser.add_argument("--stages", type=str, nargs="+", default=STAGES)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--pairs", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=BENCHMARKS_DIR/"results.json")
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+
+    args = parser.parse_args()
+
+    # The pipeline's progress messages would drown out the results
+    get_console_logger().setLevel(logging.WARNING)
+
+    results = run_benchmarks(stages=args.stages, years=args.years, pairs=args.pairs, repeats=args.repeats)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    print(pd.DataFrame(results["results"]).to_string(index=False))
+
+    if args.baseline is not None:
+
+        with open(args.baseline, "r") as file:
+            regressions = compare_with_baseline(results=results, baseline=json.load(file), tolerance=args.tolerance)
+
+        if regressions:
+
+            logger.error(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%} of the baseline: {regressions}")
+            sys.exit(1)
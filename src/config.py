@@ -1,4 +1,5 @@
 import logging
+from typing import List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from src.paths import PARENT_DIR
 
@@ -20,7 +21,64 @@ class Settings(BaseSettings):
   
   # Polygon
   polygon_api_key: str
-  
+
+  # Polygon download engine (tune these to the limits of our Polygon plan)
+  polygon_max_concurrency: int = 8
+  polygon_requests_per_second: float = 10.0
+  polygon_max_retries: int = 5
+  polygon_backoff_factor: float = 0.5
+  polygon_timeout: float = 30.0
+  polygon_download_mode: str = "auto"  # "auto", "grouped" or "range"
+
+  # Compressed on-disk cache of raw Polygon responses
+  use_response_cache: bool = True
+  response_cache_max_bytes: int = 1024**3
+
+  # In-process cache of transformed features, shared by tuning trials
+  feature_cache_max_bytes: int = 2*1024**3
+
+  # Parallel hyperparameter tuning. The storage is either a database URL (e.g. "sqlite:///optuna.db")
+  # or the path of a journal file (on a disk that every machine can reach, for multi-node tuning)
+  tuning_workers: int = 1
+  tuning_trials_per_worker: Optional[int] = None
+  tuning_storage: Optional[str] = None
+
+  # Stopping hopeless tuning trials early: "median", "percentile", "successive_halving", "hyperband" or "none".
+  # Pruning is off by default, so that every trial is scored on every fold (which also lets the folds
+  # of a trial all be fitted at once)
+  tuning_pruner: str = "none"
+  tuning_pruner_percentile: float = 25.0
+  tuning_pruner_startup_trials: int = 5
+  tuning_pruner_warmup_folds: int = 0
+
+  # Threads for each tuning worker (all cores, shared between the workers, by default), split between
+  # concurrently fitted folds (as many as possible, by default) and the models' own threads. With a
+  # pruner, only two folds are fitted at a time by default, so that pruning a trial skips the rest:
+  # setting tuning_fold_workers to 5 fits every fold at once, which is faster without pruning
+  tuning_thread_budget: Optional[int] = None
+  tuning_fold_workers: Optional[int] = None
+
+  # Incremental retraining, between full retrains (with tuning) that are made on a schedule, or when
+  # the error on the new data exceeds drift_tolerance times the test error of the last full retrain
+  full_retrain_every_days: int = 30
+  drift_tolerance: float = 1.5
+  incremental_trees: int = 20
+  incremental_window_rows: int = 250
+
+  # Experiment tracking: "comet", or "local" (an append-only JSONL file per run, for offline machines)
+  tracking_backend: str = "comet"
+  tracking_batch_size: int = 50
+  tracking_flush_interval: float = 5.0
+
+  # Synthetic OHLC data, in place of Polygon's (for testing the pipelines at scale, and offline)
+  use_synthetic_data: bool = False
+  synthetic_seed: int = 0
+  synthetic_gap_probability: float = 0.02
+  synthetic_pairs: List[str] = ["GBPGHS", "USDGHS", "EURGHS", "GBPUSD", "EURUSD"]
+
+  # Threads that the LightGBM and XGBoost boosters use to serve predictions (all cores, by default)
+  inference_threads: Optional[int] = None
+
   # CometML
   comet_api_key: str
   comet_workspace: str
@@ -1,133 +1,356 @@
-import glob
 import os
-import requests
+import glob
+import json
+import math
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
+from argparse import ArgumentParser
 
-from datetime import datetime, timedelta
+from functools import partial
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
 
 from src.config import settings
-from src.paths import DAILY_DATA_DIR
+from src.feature_pipeline.polygon_client import POLYGON_BASE_URL, get_with_retries
+from src.feature_pipeline.response_cache import response_cache
+from src.feature_pipeline.response_parser import OHLCBar, get_bars, has_results, parse_bars
+from src.feature_pipeline.ohlc_store import ohlc_store
+from src.feature_pipeline.trading_calendar import get_trading_days, get_closed_trading_days
+from src.feature_pipeline.synthetic_data import generate_ohlc
+from src.feature_pipeline.streaming_features import refresh_saved_streaming_features
+from src.paths import DAILY_DATA_DIR, SYNTHETIC_DAILY_DATA_DIR
 from src.logger import get_console_logger
 
 logger = get_console_logger()
 POLYGON_API_KEY = settings.polygon_api_key
 
+# The largest number of bars that the aggregates endpoint returns per page
+RANGE_PAGE_LIMIT = 50000
+
+# Where whole downloads are kept (synthetic data is kept apart from the real data)
+LOCAL_DATA_DIR = SYNTHETIC_DAILY_DATA_DIR if settings.use_synthetic_data else DAILY_DATA_DIR
+
 
-def get_api_response(date: datetime) -> dict:
+def get_raw_api_response(date: datetime, use_cache: bool = settings.use_response_cache) -> Optional[bytes]:
     """
-    We fetch the Polygon Forex API response.
+    We fetch the raw (unparsed) JSON of the Polygon Forex API response. The request 
+    goes through the shared (pooled and rate-limited) session, and is retried if 
+    Polygon rate-limits us or has a server error.
+
+    Responses for days that are already over are kept in a compressed local cache,
+    which is checked before any request is made. Responses without any results are
+    never cached (or read from the cache), as Polygon may still fill those days in.
     
     Args:
         date: the date with respect to which we want an API response
+        use_cache: whether to read from (and write to) the local response cache
 
     Returns:
-        date: The date with respect to which we want data.
+        Optional[bytes]: the raw API response, or None if the request failed.
     """
 
-    URL = (f"https://api.polygon.io/v2/aggs/grouped/locale/global/market/fx/{date.strftime('%Y-%m-%d')}?adjusted\=true"
-           f"&apiKey={POLYGON_API_KEY}")
+    if use_cache:
 
-    endpoint = requests.get(URL)
+        content = response_cache.get(date=date)
 
-    if endpoint.status_code != 200:
+        if content is not None and has_results(content=content):
+            return content
 
-        print(f"Error {endpoint.status_code} - {endpoint.text}")
+    URL = f"{POLYGON_BASE_URL}/v2/aggs/grouped/locale/global/market/fx/{date.strftime('%Y-%m-%d')}"
 
-    else:
+    endpoint = get_with_retries(
+        url=URL,
+        params={"adjusted": "true", "apiKey": POLYGON_API_KEY}
+    )
 
-        return endpoint.json()
+    if endpoint is not None:
 
+        # Today's data is incomplete until the market closes, so it must not be cached
+        if use_cache and date.date() < datetime.today().date() and has_results(content=endpoint.content):
+            response_cache.put(date=date, content=endpoint.content)
 
-def extract_results(
-        response: dict,
-        date: datetime,
-        index: int,
-        base_currency: str = "GBP",
-        target_currency: str = "GHS"
-) -> pd.DataFrame:
+        return endpoint.content
+
+
+def get_api_response(date: datetime, use_cache: bool = settings.use_response_cache) -> dict:
     """
-    We search through the value associated with the "results"
-    key in the API response, parse it for the  OHLC data, and put
-    it all into a dataframe.
+    We fetch the Polygon Forex API response, and parse all of it.
+    
+    Args:
+        date: the date with respect to which we want an API response
+        use_cache: whether to read from (and write to) the local response cache
 
     Returns:
-        pd.DataFrame: all the OHLC data from the given start date 
-                      to the end date.
+        dict: the API response, or None if the request failed.
     """
 
-    if "results" in response.keys():
+    content = get_raw_api_response(date=date, use_cache=use_cache)
 
-        for results in response["results"]:
+    if content is not None:
 
-            if results["T"] == f"C:{base_currency}{target_currency}":
-                opening_rate = results["o"]
-                peak_rate = results["h"]
-                lowest_rate = results["l"]
-                closing_rate = results["c"]
+        return json.loads(content)
 
-                return pd.DataFrame(
-                    {
-                        "Date": date.strftime("%Y-%m-%d"),
-                        f"Opening_rate_{base_currency}{target_currency}": opening_rate,
-                        f"Peak_rate_{base_currency}{target_currency}": peak_rate,
-                        f"Lowest_rate_{base_currency}{target_currency}": lowest_rate,
-                        f"Closing_rate_{base_currency}{target_currency}": closing_rate
-                    }, index=[index]
-                )
 
+def get_api_responses(
+        dates: Sequence[datetime],
+        max_workers: int = settings.polygon_max_concurrency,
+        raw: bool = True,
+        use_cache: bool = settings.use_response_cache
+) -> List[Optional[bytes|dict]]:
+    """
+    Fetch the API responses for many dates concurrently, using a pool of threads
+    that share one session (and one rate limiter).
 
-def is_today(date: datetime) -> bool:
+    Args:
+        dates: the dates for which we want API responses
+        max_workers: the maximum number of requests that can be in flight at once
+        raw: whether to return the raw JSON of each response (which extract_pairs 
+             can parse selectively), rather than the fully parsed responses.
+        use_cache: whether to read from (and write to) the local response cache
+
+    Returns:
+        List[Optional[bytes|dict]]: the responses, in the same order as the dates.
     """
-    I could have said "if date == datetime.today()", however it doesn't work because datetime.today()
-    measures time down to the microsecond (I checked). Consequently, the returned boolean will always 
-    be True.  I suspect that this happens because by the time the program gets to this if statement, 
-    the value of datetime.today() will have changed from what it was when the program was first executed.
+
+    fetch = partial(get_raw_api_response if raw else get_api_response, use_cache=use_cache)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        return list(
+            tqdm(executor.map(fetch, dates), total=len(dates))
+        )
+
+
+def make_ohlc_record(bar: OHLCBar, date: datetime, pair: str) -> dict:
+    """ Put the OHLC data of a single ticker on a given date into a record (row) """
+
+    return {
+        "Date": date.strftime("%Y-%m-%d"),
+        f"Opening_rate_{pair}": bar.o,
+        f"Peak_rate_{pair}": bar.h,
+        f"Lowest_rate_{pair}": bar.l,
+        f"Closing_rate_{pair}": bar.c
+    }
+
+
+def extract_pairs(
+        responses: List[Optional[bytes|dict]],
+        dates: Sequence[datetime],
+        pairs: List[str]|str = "all"
+) -> Dict[str, pd.DataFrame]:
+    """
+    Pull out the OHLC data of every requested pair from each response. This way, N pairs 
+    cost one request per day rather than N. Dates on which a pair has no data are left 
+    out of that pair's dataframe.
+
+    Raw responses are parsed selectively, so only the requested tickers are ever decoded.
+    Responses which have already been parsed are indexed by ticker once.
 
     Args:
-        date: the date to be checked.
-    
+        responses: the API responses (raw or parsed), one per date.
+        dates: the dates corresponding to each response.
+        pairs: currency pairs written as the base currency followed by the target 
+               currency (e.g. "GBPGHS"), or "all" for every pair in the responses.
+
     Returns:
-        bool: returns True if the entered date is today, and False if it is not.
+        Dict[str, pd.DataFrame]: the OHLC data (in date order) of each pair.
     """
 
-    today = {
-        "year": datetime.today().year,
-        "month": datetime.today().month,
-        "day": datetime.today().day
+    if pairs == "all":
+        records, tickers = {}, None
+
+    else:
+        records, tickers = {pair: [] for pair in pairs}, [f"C:{pair}" for pair in pairs]
+
+    for response, date in zip(responses, dates):
+
+        if response is None:
+            continue
+
+        if isinstance(response, bytes):
+            bars = parse_bars(content=response, tickers=tickers)
+        else:
+            bars = get_bars(response=response, tickers=tickers)
+
+        for ticker, bar in bars.items():
+
+            pair = ticker.removeprefix("C:")
+            records.setdefault(pair, []).append(make_ohlc_record(bar=bar, date=date, pair=pair))
+
+    return {
+        pair: pd.DataFrame.from_records(pair_records) for pair, pair_records in records.items()
     }
 
-    return (
-            date.day == today["day"] and date.month == today["month"] and date.year == today["year"]
+
+def get_range_aggregates(
+        pair: str,
+        start_date: datetime,
+        end_date: datetime
+) -> List[dict]:
+    """
+    Fetch the daily bars of a single pair over a whole date range from Polygon's 
+    per-ticker aggregates endpoint, following the "next_url" of each page until 
+    there are no pages left. Years of data fit in a single page.
+
+    Args:
+        pair: the currency pair (e.g. "GBPGHS")
+        start_date: the first date of the range
+        end_date: the last date of the range
+
+    Returns:
+        List[dict]: the daily bars, in date order.
+    """
+
+    URL = (f"{POLYGON_BASE_URL}/v2/aggs/ticker/C:{pair}/range/1/day/"
+           f"{start_date.strftime('%Y-%m-%d')}/{end_date.strftime('%Y-%m-%d')}")
+
+    params = {"adjusted": "true", "sort": "asc", "limit": RANGE_PAGE_LIMIT, "apiKey": POLYGON_API_KEY}
+    aggregates = []
+
+    while URL is not None:
+
+        endpoint = get_with_retries(url=URL, params=params)
+
+        if endpoint is None:
+
+            logger.error(f"Failed to fetch all the daily bars of {pair}")
+            break
+
+        response = endpoint.json()
+        aggregates.extend(response.get("results", []))
+
+        # The next URL already contains the rest of the query parameters (and the cursor)
+        URL = response.get("next_url")
+        params = {"apiKey": POLYGON_API_KEY}
+
+    return aggregates
+
+
+def extract_range_aggregates(
+        aggregates: List[dict],
+        dates: Sequence[datetime],
+        pair: str
+) -> pd.DataFrame:
+    """
+    Put the daily bars from the aggregates endpoint into the same dataframe that 
+    extract_pairs would have made for the pair from the grouped endpoint. Only 
+    the bars on the requested dates are kept.
+
+    Returns:
+        pd.DataFrame: the OHLC data of the pair (in date order).
+    """
+
+    requested_dates = {date.strftime("%Y-%m-%d"): date for date in dates}
+    records = {}
+
+    for results in aggregates:
+
+        # Each bar is timestamped (in milliseconds) with the start of its UTC day
+        day = datetime.utcfromtimestamp(results["t"]/1000).strftime("%Y-%m-%d")
+
+        if day in requested_dates:
+
+            bar = OHLCBar(o=results["o"], h=results["h"], l=results["l"], c=results["c"])
+            records[day] = make_ohlc_record(bar=bar, date=requested_dates[day], pair=pair)
+
+    return pd.DataFrame.from_records(
+        [records[day] for day in sorted(records)]
     )
 
 
-def is_closed() -> bool:
+def choose_download_mode(number_of_pairs: int, number_of_days: int) -> str:
     """
-    The contents of the dictionary contain the official times (converted to GMT from EST) during which the Forex market
-    is closed (according to Polygon).
-    
-    The value of this variable will be fixed in memory. However, datetime.utcnow() measures time down to the nanosecond.
-    Consequently, its value will be changing as Python processes each part of the dictionary. However, these are such 
-    small timescales that I'm willing to have datetime.utcnow() be a fixed value for the sake of readability because the
-    risk that I'll have any issues with the booleans is vanishingly small.
+    The grouped endpoint costs one request per day (no matter how many pairs we want),
+    whereas the aggregates endpoint costs one request per pair (per page of bars). We 
+    pick whichever needs fewer requests, unless a mode has been set in the settings.
+
+    Returns:
+        str: "grouped" or "range"
+    """
+
+    if settings.polygon_download_mode != "auto":
+        return settings.polygon_download_mode
+
+    pages_per_pair = max(1, math.ceil(number_of_days/RANGE_PAGE_LIMIT))
+
+    return "range" if number_of_pairs*pages_per_pair < number_of_days else "grouped"
+
+
+def download_ohlc(
+        pairs: List[str]|str,
+        dates: Sequence[datetime],
+        use_cache: bool = settings.use_response_cache
+) -> Dict[str, pd.DataFrame]:
+    """
+    Download the OHLC data of the requested pairs on the given dates, using either 
+    per-day grouped requests or per-pair range requests (whichever needs fewer).
     
+    When settings.use_synthetic_data is set, the data is generated instead (see 
+    synthetic_data.py), and no requests are made at all.
+
+    Args:
+        pairs: currency pairs written as the base currency followed by the target 
+               currency (e.g. ["GBPGHS"]), or "all" for every FX pair.
+        dates: the (trading) dates on which we want data
+        use_cache: whether grouped responses may be read from (and written to) the
+                   local response cache
+
     Returns:
-        bool: returns True if the market is closed, and False if it isn't
+        Dict[str, pd.DataFrame]: the OHLC data (in date order) of each pair.
     """
 
-    now = datetime.utcnow()
+    if settings.use_synthetic_data:
+        return generate_ohlc(pairs=pairs, dates=dates)
 
-    closed = {
-        "saturday": now.day == 5,
-        "friday_after_10": now.day == 4 and now.hour > 22,
-        "sunday_before_10": now.day == 6 and now.hour < 22
-    }
+    if pairs != "all" and len(dates) > 0 and choose_download_mode(len(pairs), len(dates)) == "range":
 
-    return (
-            closed["saturday"] or closed["friday_after_10"] or closed["sunday_before_10"]
-    )
+        logger.info(f"Downloading {len(pairs)} pair(s) with the aggregates endpoint")
+
+        def download_pair(pair: str) -> pd.DataFrame:
+
+            aggregates = get_range_aggregates(pair=pair, start_date=min(dates), end_date=max(dates))
+
+            return extract_range_aggregates(aggregates=aggregates, dates=dates, pair=pair)
+
+        with ThreadPoolExecutor(max_workers=settings.polygon_max_concurrency) as executor:
+
+            return dict(
+                zip(pairs, executor.map(download_pair, pairs))
+            )
+
+    responses = get_api_responses(dates=dates, use_cache=use_cache)
+
+    return extract_pairs(responses=responses, dates=dates, pairs=pairs)
+
+
+def extract_results(
+        response: dict,
+        date: datetime,
+        index: int,
+        base_currency: str = "GBP",
+        target_currency: str = "GHS"
+) -> pd.DataFrame:
+    """
+    We search through the value associated with the "results"
+    key in the API response, parse it for the  OHLC data, and put
+    it all into a dataframe.
+
+    Returns:
+        pd.DataFrame: all the OHLC data from the given start date 
+                      to the end date.
+    """
+
+    pair = f"{base_currency}{target_currency}"
+    bar = get_bars(response=response, tickers=[f"C:{pair}"]).get(f"C:{pair}")
+
+    if bar is not None:
+
+        return pd.DataFrame(
+            make_ohlc_record(bar=bar, date=date, pair=pair), index=[index]
+        )
 
 
 def get_daily_ohlc(
@@ -152,7 +375,7 @@ def get_daily_ohlc(
     start_date_str = start_date.strftime(format="%Y-%m-%d")
     end_date_str = end_date.strftime(format="%Y-%m-%d")
 
-    file_path = DAILY_DATA_DIR / f"{base_currency}{target_currency}_{start_date_str}_{end_date_str}.parquet"
+    file_path = LOCAL_DATA_DIR / f"{base_currency}{target_currency}_{start_date_str}_{end_date_str}.parquet"
 
     if file_path.exists():
 
@@ -164,57 +387,101 @@ def get_daily_ohlc(
 
     else:
 
-        index = 0
-        dataframe = pd.DataFrame()
+        pair = f"{base_currency}{target_currency}"
 
-        if is_today(date=end_date):
+        dates = get_dates_to_download(start_date=start_date, end_date=end_date)
 
-            # if it is  currently, before 5PM, the program should refrain from downloading today's data.
-            if is_closed():
-                end_date = end_date - timedelta(days=1)
+        dataframe = download_ohlc(pairs=[pair], dates=dates)[pair]
 
-        date_range = pd.date_range(
-            start=start_date,
-            end=end_date
-        )
+        dataframe = dataframe.reset_index(drop=True)
+        dataframe.to_parquet(path=file_path)
 
-        for date in tqdm(date_range):
+        return dataframe
 
-            # The forex market closes on Saturdays (which the datetime package sees as day 5)
-            if datetime.weekday(date) != 5:
 
-                api_response = get_api_response(date=date)
+def get_daily_ohlc_for_pairs(
+        pairs: List[str]|str = "all",
+        start_date: datetime = datetime(2017, 1, 1),
+        end_date: datetime = datetime.today()
+) -> Dict[str, pd.DataFrame]:
+    """
+    Download the daily exchange rate data of several currency pairs at once. Each
+    day's grouped response contains every FX ticker, so all the requested pairs 
+    are extracted from a single request per day (unless there are few enough 
+    pairs for per-pair range requests to be cheaper). The data of each pair is 
+    appended to the partitioned OHLC store.
 
-                current_date_data = extract_results(
-                    response=api_response,
-                    date=date,
-                    index=index
-                )
+    Args:
+        pairs: currency pairs written as the base currency followed by the target 
+               currency (e.g. ["GBPGHS", "EURUSD"]), or "all" for every FX pair.
+        start_date: the date from which we want to collect data
+        end_date: the last date on which we want data
 
-                dataframe = pd.concat(
-                    [dataframe, current_date_data]
-                )
+    Returns:
+        Dict[str, pd.DataFrame]: a dataframe of daily exchange rates for each pair.
+    """
 
-                index += 1
+    start_date_str = start_date.strftime(format="%Y-%m-%d")
+    end_date_str = end_date.strftime(format="%Y-%m-%d")
 
-            else:
-                continue
+    dates = get_dates_to_download(start_date=start_date, end_date=end_date)
 
-        dataframe = dataframe.reset_index(drop=True)
-        dataframe.to_parquet(path=file_path)
+    dataframes = download_ohlc(pairs=pairs, dates=dates)
 
-        return dataframe
+    logger.info(f"Storing the data of {len(dataframes)} pairs")
+
+    for pair, dataframe in dataframes.items():
+
+        if dataframe.empty:
+
+            logger.warning(f"There is no data on {pair} between {start_date_str} and {end_date_str}")
+            continue
+
+        ohlc_store.append(pair=pair, dataframe=dataframe)
 
+    return dataframes
 
-def get_newest_local_dataset() -> pd.DataFrame:
+
+def get_dates_to_download(start_date: datetime, end_date: datetime) -> List[datetime]:
+    """
+    Make a list of the dates between the start and end dates on which the 
+    forex market had a full trading session, according to the trading calendar.
+    Saturdays, Sundays and holidays are left out, as they return no usable data,
+    and so are sessions that have not closed yet (such as today's, until 5PM in 
+    New York), as their data is incomplete.
+
+    Returns:
+        List[datetime]: the dates for which we will request data
     """
-    Returns the most recent file locally saved data file as a Pandas
+
+    if start_date > end_date:
+        return []
+
+    trading_days = get_closed_trading_days(start_date=start_date, end_date=end_date)
+
+    return list(pd.DatetimeIndex(trading_days))
+
+
+def get_local_files(base_currency: str = "GBP", target_currency: str = "GHS") -> List[str]:
+    """ Returns the paths of the locally saved data files of the given currency pair """
+
+    return glob.glob(f"{LOCAL_DATA_DIR}/{base_currency}{target_currency}_*.parquet")
+
+
+def get_newest_local_dataset(
+        base_currency: str = "GBP",
+        target_currency: str = "GHS"
+) -> pd.DataFrame:
+    """
+    Returns the locally saved data on the given currency pair as a Pandas
     dataframe.
     
-    Checks for the presence of any data in the folder where daily data 
-    is kept. If one or more files are present, it returns the newsest 
-    file (chronologically, not content-wise). If there is no saved 
-    data, the function will download data using the default parameters.
+    The data is read from the partitioned OHLC store, whose manifest 
+    tells us which files make up the latest version of the data. If the
+    pair is not in the store yet, the newest file (chronologically, not 
+    content-wise) in the folder where daily data used to be kept is 
+    moved into the store. If there is no saved data at all, the function 
+    will download data using the default parameters.
     
     The primary purpose of this function is to provide a way for the 
     most up-to-date dataset to be used to generate training data.
@@ -223,130 +490,199 @@ def get_newest_local_dataset() -> pd.DataFrame:
         pd.DataFrame
     """
 
-    with os.scandir(f"{DAILY_DATA_DIR}") as data:
+    pair = f"{base_currency}{target_currency}"
+
+    if not ohlc_store.has_pair(pair=pair):
 
-        if any(data):
+        files = get_local_files(base_currency=base_currency, target_currency=target_currency)
 
-            files = glob.glob(f"{DAILY_DATA_DIR}/*.parquet")
+        if any(files):
 
             newest_file = max(files, key=os.path.getctime)
 
+            logger.info(f"Moving the data in {newest_file} into the OHLC store")
+
             dataframe = pd.read_parquet(newest_file)
 
         else:
 
             logger.info("There is no file saved in local storage -> Fetching data from 2017 till date.")
 
-            dataframe = get_daily_ohlc()
+            dataframe = get_daily_ohlc(base_currency=base_currency, target_currency=target_currency)
 
-        return dataframe
+        ohlc_store.append(pair=pair, dataframe=dataframe)
 
+    return ohlc_store.read(pair=pair)
 
-def update_ohlc(
+
+def find_missing_dates(stored_dates: pd.Series) -> List[datetime]:
+    """
+    Compare the dates on which we have data with the trading days (according to 
+    the trading calendar) between the first and last of those dates, in a single
+    vectorized pass.
+
+    Args:
+        stored_dates: the dates (as "%Y-%m-%d" strings) on which we have data
+
+    Returns:
+        List[datetime]: the trading days on which we have no data
+    """
+
+    stored = pd.to_datetime(stored_dates).values.astype("datetime64[D]")
+
+    expected = get_trading_days(
+        start_date=pd.Timestamp(stored.min()), 
+        end_date=pd.Timestamp(stored.max())
+    )
+
+    missing = np.setdiff1d(expected, stored, assume_unique=True)
+
+    return list(pd.DatetimeIndex(missing))
+
+
+def fill_ohlc_gaps(
         base_currency: str = "GBP",
         target_currency: str = "GHS"
 ) -> pd.DataFrame:
     """
-    This function checks for an existing dataframe, and updates it.
-    If it finds, it will update. If it doesn't find it, it will 
-    default to fetching data from the beginning of 2017 till date.
-
-    In the former case, for each date between the final date in the dataframe
-    to the current date, we will make a dataframe of OHLC data, and 
-    concatenate it with the input dataframe.
+    Days on which a download failed or returned nothing leave gaps in the middle 
+    of the stored data, which update_ohlc (which only ever looks forward) would 
+    never fill. Here, we find those gaps, fetch only the missing dates (in 
+    parallel), and append whatever we get to the OHLC store, which slots the 
+    rows into their partitions without rewriting the rest of the data.
 
-    Returns:return initial_data
-        pd.DataFrame: This is the updated dataframe
+    Returns:
+        pd.DataFrame: the pair's data, after the gaps have been filled
     """
 
-    logger.info("Looking for pre-existing files")
+    pair = f"{base_currency}{target_currency}"
 
-    if any(os.scandir(DAILY_DATA_DIR)):
+    missing_dates = find_missing_dates(stored_dates=ohlc_store.get_stored_dates(pair=pair))
 
-        logger.info("Getting the most recent file in local storage")
+    if len(missing_dates) == 0:
 
-        initial_data = get_newest_local_dataset()
+        logger.info("There are no gaps in the data")
 
-        logger.info("Checking whether the file is up-to-date")
+        return ohlc_store.read(pair=pair)
 
-        today = datetime.today()
+    logger.info(f"Fetching data for {len(missing_dates)} missing dates")
 
-        # This is the date from which the file will be updated if necessary
-        update_from = datetime.strptime(
-            initial_data["Date"].iloc[-1],
-            "%Y-%m-%d"
-        )
+    # A cached response for a missing date evidently lacks the pair, so we ask Polygon again
+    dataframe = download_ohlc(pairs=[pair], dates=missing_dates, use_cache=False)[pair]
 
-        # Check whether the last date in the file corresponds to today
-        if is_today(date=update_from):
+    logger.info(f"Filled {len(dataframe)} of the {len(missing_dates)} gaps")
 
-            logger.info("The file is up-to-date")
+    ohlc_store.append(pair=pair, dataframe=dataframe)
 
-            return initial_data
+    # Read the filled data before the compaction starts merging (and deleting) part files
+    filled_data = ohlc_store.read(pair=pair)
+    ohlc_store.compact_in_background(pair=pair)
 
-        else:
+    return filled_data
 
-            logger.info(f"The file was up-to-date as of {update_from} -> Updating it")
 
-            to_download = pd.date_range(
-                start=update_from + timedelta(days=1),
-                end=today
-            )
+def update_ohlc(
+        base_currency: str = "GBP",
+        target_currency: str = "GHS",
+        fill_gaps: bool = False,
+        refresh_features: bool = True
+) -> pd.DataFrame:
+    """
+    This function checks for existing data on the pair, and updates it.
+    If it finds, it will update. If it doesn't find it, it will 
+    default to fetching data from the beginning of 2017 till date.
+    If requested, any gaps in the existing data are filled first.
 
-            index = initial_data.index[-1]
+    In the former case, for each date between the final date in the data
+    to the current date, we will make a dataframe of OHLC data, and 
+    append it to the OHLC store. Only the partitions of the new dates are 
+    written, and the small files that this creates are merged in the 
+    background.
 
-            dataframe = pd.DataFrame()
+    Unless told otherwise, the saved feature states of the pair (see 
+    streaming_features.py) are then brought up to date with the new days.
 
-            for date in tqdm(to_download):
+    Returns:
+        pd.DataFrame: This is the updated dataframe
+    """
 
-                if is_today(date=date) and is_closed():
-                    
-                    logger.info("There is nothing to download")
+    pair = f"{base_currency}{target_currency}"
 
-                    break 
+    logger.info("Looking for pre-existing data")
 
-                download = get_api_response(date=date)
+    if ohlc_store.has_pair(pair=pair) or any(get_local_files(base_currency=base_currency, target_currency=target_currency)):
 
-                new_data = extract_results(
-                    response=download,
-                    date=date,
-                    index=index
-                )
+        logger.info("Getting the data in local storage")
 
-                if new_data is None:
-                    continue
+        initial_data = get_newest_local_dataset(base_currency=base_currency, target_currency=target_currency)
 
-                dataframe = pd.concat(
-                    objs=[dataframe, new_data]
-                )
+        if fill_gaps:
 
-                index += 1
+            logger.info("Looking for gaps in the data")
 
-            updated_data = pd.concat(
-                objs=[initial_data, dataframe]
-            )
+            initial_data = fill_ohlc_gaps(base_currency=base_currency, target_currency=target_currency)
 
-            updated_data = updated_data.reset_index(drop=True)
+        logger.info("Checking whether the data is up-to-date")
 
-            initial_start_date = initial_data["Date"].iloc[0]
-            today_str = today.strftime(format="%Y-%m-%d")
+        last_date = ohlc_store.get_last_date(pair=pair)
 
-            updated_data.to_parquet(
-                path=DAILY_DATA_DIR / f"{base_currency}{target_currency}_{initial_start_date}_{today_str}.parquet"
-            )
+        # This is the date from which the data will be updated if necessary. If nothing has 
+        # been stored yet (the first download came back empty), we start from 2017 again.
+        if last_date is None:
+            update_from = datetime(2017, 1, 1) - timedelta(days=1)
+
+        else:
+            update_from = datetime.strptime(last_date, "%Y-%m-%d")
+
+        # The sessions that have closed since the last date in the store (if there are any)
+        to_download = get_dates_to_download(
+            start_date=update_from + timedelta(days=1),
+            end_date=datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        )
+
+        if len(to_download) == 0:
+
+            logger.info("The data is up-to-date")
 
-            return updated_data
+            data = initial_data
+
+        else:
+
+            logger.info(f"The data was up-to-date as of {update_from} -> Updating it")
+
+            dataframe = download_ohlc(pairs=[pair], dates=to_download)[pair]
+
+            ohlc_store.append(pair=pair, dataframe=dataframe)
+            ohlc_store.compact_in_background(pair=pair)
+
+            data = pd.concat(
+                objs=[initial_data, dataframe]
+            ).reset_index(drop=True)
 
     else:
 
         logger.info("No dataset has been saved -> Fetching data from the beginning of 2017 till date by default")
 
-        # Download the data with the default values 
-        dataframe = get_daily_ohlc()
+        # Download the data with the default dates, and put it in the store
+        data = get_newest_local_dataset(base_currency=base_currency, target_currency=target_currency)
 
-        return dataframe
+    if refresh_features and not data.empty:
+
+        refresh_saved_streaming_features(
+            rates=data, 
+            base_currency=base_currency, 
+            target_currency=target_currency,
+            rebuild=fill_gaps
+        )
+
+    return data
 
 
 if __name__ == "__main__":
 
-    update_ohlc()
\ No newline at end of file
+    parser = ArgumentParser()
+    parser.add_argument("--fill_gaps", action="store_true", default=False)
+
+    args = parser.parse_args()
+
+    update_ohlc(fill_gaps=args.fill_gaps)
@@ -1,12 +1,11 @@
 import numpy as np
 import pandas as pd
-from typing import Optional
+from typing import Optional, Tuple
 
 from sklearn.pipeline import Pipeline, make_pipeline
-from sklearn.preprocessing import FunctionTransformer
 
 from src.feature_pipeline.data_extraction import update_ohlc
-from src.feature_pipeline.feature_engineering import get_percentage_change, RSI, EMA
+from src.feature_pipeline.feature_engineering import FeatureAssembler
 from src.logger import get_console_logger
 from src.paths import TRAINING_DATA_DIR
 
@@ -33,24 +32,41 @@ def get_cutoff_indices(
     this.
     """
 
-    indices = []
-    stop_position = len(data) - 1
+    indices = [
+        (first_index, first_index + input_seq_len, first_index + input_seq_len + 1) 
+        for first_index in range(0, len(data) - input_seq_len - 1, step_size)
+    ]
 
-    subseq_first_index = 0
-    subseq_mid_index = input_seq_len
-    subseq_last_index = input_seq_len + 1
+    return indices
 
-    while subseq_last_index <= stop_position:
-        
-        indices.append(
-            (subseq_first_index, subseq_mid_index, subseq_last_index)
-        )
-        
-        subseq_first_index += step_size
-        subseq_mid_index += step_size
-        subseq_last_index += step_size
 
-    return indices
+def make_sliding_windows(
+        values: np.ndarray,
+        input_seq_len: int = 30,
+        step_size: int = 1,
+        target_horizon: int = 1
+) -> Tuple[np.ndarray, np.ndarray]:
+
+    """
+    Build the feature windows and the targets as strided views of the array of closing
+    rates, so that no data is copied, and no loop is run in Python. The windows start 
+    at every step_size-th row, and each is followed by target_horizon targets. As in 
+    get_cutoff_indices, the final row is never used as a target.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: an array of shape (number of windows, input_seq_len)
+                                       and another of shape (number of windows, target_horizon).
+    """
+
+    number_of_windows = max(0, (len(values) - input_seq_len - target_horizon - 1)//step_size + 1)
+
+    if number_of_windows == 0:
+        return np.empty((0, input_seq_len), dtype=values.dtype), np.empty((0, target_horizon), dtype=values.dtype)
+
+    windows = np.lib.stride_tricks.sliding_window_view(values, window_shape=input_seq_len + target_horizon)
+    windows = windows[:number_of_windows*step_size:step_size]
+
+    return windows[:, :input_seq_len], windows[:, input_seq_len:]
 
 
 def transform_ts_data_into_features_and_target(
@@ -58,7 +74,8 @@ def transform_ts_data_into_features_and_target(
         input_seq_len: Optional[int] = 30,
         step_size: Optional[int] = 1,
         base_currency: str = "GBP",
-        target_currency: str = "GHS"
+        target_currency: str = "GHS",
+        target_horizon: int = 1
     ) -> list[pd.DataFrame, pd.Series]:
     
     """
@@ -66,6 +83,10 @@ def transform_ts_data_into_features_and_target(
     format that is conducive for training supervised training
     algorithms.
 
+    The windows are strided views of the closing rates (see 
+    make_sliding_windows). With a target horizon of more than
+    one day, there is one target column for each day ahead.
+
     Returns:
         tuple: consisting of the dataframe of features, and
                a pandas series of the target variable.
@@ -80,27 +101,14 @@ def transform_ts_data_into_features_and_target(
 
     ts_data = ts_data.sort_values(by=["Date"])
 
-    indices = get_cutoff_indices(
-        data=ts_data, 
-        input_seq_len=input_seq_len, 
-        step_size=step_size
-        )
-
-    x = np.ndarray(
-        shape=(len(indices), input_seq_len), dtype=np.float32
-    )
+    closing_rates = ts_data[f"Closing_rate_{base_currency}{target_currency}"].to_numpy(dtype=np.float32)
 
-    y = np.ndarray(
-        shape=(len(indices)), dtype=np.float32
+    x, y = make_sliding_windows(
+        values=closing_rates, 
+        input_seq_len=input_seq_len, 
+        step_size=step_size, 
+        target_horizon=target_horizon
     )
-    
-    dates = []
-    for i, idx in enumerate(indices):
-        
-        x[i,:] = ts_data.iloc[idx[0]: idx[1]][f"Closing_rate_{base_currency}{target_currency}"].values
-        y[i] = ts_data.iloc[idx[1]: idx[2]][f"Closing_rate_{base_currency}{target_currency}"].values
-
-        dates.append(ts_data.iloc[idx[1]]["Date"])
 
     features = pd.DataFrame(
         x, columns=[
@@ -109,43 +117,60 @@ def transform_ts_data_into_features_and_target(
     )
 
     targets = pd.DataFrame(
-        y, columns=[f"Closing_rate_{base_currency}{target_currency}_next_day"]
+        y, columns=[f"Closing_rate_{base_currency}{target_currency}_next_day"] + [
+            f"Closing_rate_{base_currency}{target_currency}_{i + 1}_days_ahead" for i in range(1, target_horizon)
+        ]
     )
 
     return features, targets
 
 
+def get_target_dates(
+        original_data: pd.DataFrame,
+        input_seq_len: Optional[int] = 30,
+        step_size: Optional[int] = 1,
+        target_horizon: int = 1
+    ) -> pd.Series:
+
+    """
+    The date of the (first) target of each window that transform_ts_data_into_features_and_target
+    makes from the same data, found by making the same windows out of the rows' positions.
+    Since the rows of features carry no dates, these let us tell which windows are new 
+    to a model, even after rows have been inserted into the middle of the history.
+
+    Returns:
+        pd.Series: the dates (as "%Y-%m-%d" strings), one for each window.
+    """
+
+    dates = original_data["Date"].sort_values().to_numpy()
+
+    _, target_positions = make_sliding_windows(
+        values=np.arange(len(dates)), 
+        input_seq_len=input_seq_len, 
+        step_size=step_size, 
+        target_horizon=target_horizon
+    )
+
+    return pd.Series(dates[target_positions[:, 0]], name="Date")
+
+
 def get_preprocessing_pipeline(
     rsi_length: int = 14,
     ema_length: int = 14
     ) -> Pipeline:
     
-    """ Returns a pipeline that combines all of the feature engineering steps """
+    """ 
+    Returns a pipeline that combines all of the feature engineering steps 
+    (the percentage changes over 2, 5, 14 and 30 days, RSI, and EMA), which 
+    are assembled into a single float32 block by FeatureAssembler.
+    """
 
     return make_pipeline(
-        
-        FunctionTransformer(
-            func=get_percentage_change, 
-            kw_args={"days": 2}
-            ),
-        
-        FunctionTransformer(
-            func=get_percentage_change, 
-            kw_args={"days": 5}
-            ),
-        
-        FunctionTransformer(
-            func=get_percentage_change, 
-            kw_args={"days": 14}
-            ),
-        
-        FunctionTransformer(
-            func=get_percentage_change, 
-            kw_args={"days": 30}
-            ),
-
-        RSI(rsi_length=rsi_length),
-        EMA(ema_length=ema_length)
+        FeatureAssembler(
+            rsi_length=rsi_length, 
+            ema_length=ema_length, 
+            percentage_change_days=(2, 5, 14, 30)
+        )
     )
 
 
@@ -1,10 +1,11 @@
+import numpy as np
 import pandas as pd 
-import pandas_ta as ta
-from typing import Optional
+from typing import List, Optional
 
 from sklearn.base import BaseEstimator, TransformerMixin
 
 from src.logger import get_console_logger
+from src.feature_pipeline.indicators import compute_lagged_indicator, rsi, ema
 from src.miscellaneous import get_closing_price_columns
 
 logger = get_console_logger()
@@ -14,9 +15,10 @@ class RSI(BaseEstimator, TransformerMixin):
     """
     This class is primarily concerned with making its transform method
     an instrument for feature engineering. In that method, we will 
-    apply the pandas_ta's RSI indicator to the closing rates for every
-    day for the past month, creating a corresponding column for these 
-    RSI values each time.
+    compute the RSI of the closing rates (just once, over the series 
+    that the windows were cut from), and lag it in the same way as 
+    the closing rates, creating an RSI column for every day of the 
+    past month.
     """
     
     def __init__(self, rsi_length: int = 14):
@@ -38,12 +40,20 @@ class RSI(BaseEstimator, TransformerMixin):
         
         logger.info("Adding RSI to the features")
         
-        for col in get_closing_price_columns(data = X):
+        columns = get_closing_price_columns(data = X)
+        
+        values = compute_lagged_indicator(
+            windows=X[columns].to_numpy(), 
+            indicator=rsi, 
+            length=self.rsi_length
+        )
+        
+        for i, col in enumerate(columns):
             
             X.insert(
                 loc= X.shape[1],
                 column=f"RSI_{col}",
-                value= ta.rsi(X[col], length=self.rsi_length), 
+                value= values[:, i], 
                 allow_duplicates=False
             )
             
@@ -57,9 +67,10 @@ class EMA(BaseEstimator, TransformerMixin):
     """
     This class is primarily concerned with making its transform method
     an instrument for feature engineering. In that method, we will 
-    apply the pandas_ta's EMA indicator to the closing rates for every
-    day for the past month, creating a corresponding column for these 
-    EMA values each time.
+    compute the EMA of the closing rates (just once, over the series 
+    that the windows were cut from), and lag it in the same way as 
+    the closing rates, creating an EMA column for every day of the 
+    past month.
     """
     
     def __init__(self, ema_length):
@@ -72,12 +83,20 @@ class EMA(BaseEstimator, TransformerMixin):
 
     def transform(self, X: pd.DataFrame):
         
-        for col in get_closing_price_columns(data = X):
+        columns = get_closing_price_columns(data = X)
+        
+        values = compute_lagged_indicator(
+            windows=X[columns].to_numpy(), 
+            indicator=ema, 
+            length=self.ema_length
+        )
+        
+        for i, col in enumerate(columns):
         
             X.insert(
                 loc=X.shape[1],
                 column=f"EMA_{col}",
-                value=ta.ema(X[col], length = self.ema_length),
+                value=values[:, i],
                 allow_duplicates=False
             )
             
@@ -108,4 +127,96 @@ def get_percentage_change(
         )/ X[f"Closing_rate_{base_currency}{target_currency}_{days}_day_ago"]
     )
         
-    return X
\ No newline at end of file
+    return X
+
+class FeatureAssembler(BaseEstimator, TransformerMixin):
+    
+    """
+    Does the work of the get_percentage_change transformers, RSI and EMA in one step.
+    Rather than growing the dataframe one column at a time (which fragments it, upcasts
+    the float32 windows to float64, and changes the caller's dataframe), we plan all the
+    output columns up front, and fill a single contiguous float32 block. The input 
+    dataframe is left untouched. The columns come out in the same order as before:
+    
+    - the input columns
+    - the percentage changes between yesterday and each of percentage_change_days ago
+    - the RSI of each of the closing rates
+    - the EMA of each of the closing rates
+    """
+    
+    def __init__(
+        self, 
+        rsi_length: int = 14, 
+        ema_length: int = 14,
+        percentage_change_days: tuple = (2, 5, 14, 30)
+    ):
+        
+        self.rsi_length = rsi_length
+        self.ema_length = ema_length
+        self.percentage_change_days = percentage_change_days
+        
+    def fit(self, X: pd.DataFrame, y: Optional[pd.DataFrame|pd.Series] = None):
+
+        return self
+
+    def __sklearn_is_fitted__(self) -> bool:
+
+        # Nothing is learned during fitting, so the transformer is always ready to transform
+        return True
+
+    def compute_rsi(self, windows: np.ndarray) -> np.ndarray:
+        
+        """ Returns the RSI of the closing rates, lagged like them (a column for each day) """
+        
+        return compute_lagged_indicator(windows=windows, indicator=rsi, length=self.rsi_length)
+    
+    def compute_ema(self, windows: np.ndarray) -> np.ndarray:
+        
+        """ Returns the EMA of the closing rates, lagged like them (a column for each day) """
+        
+        return compute_lagged_indicator(windows=windows, indicator=ema, length=self.ema_length)
+    
+    def get_output_columns(self, X: pd.DataFrame) -> List[str]:
+        
+        closing_columns = get_closing_price_columns(data = X)
+        
+        return list(X.columns) + [
+            f"percentage_change_between_yesterday_and_{days}_days_ago" for days in self.percentage_change_days
+        ] + [f"RSI_{col}" for col in closing_columns] + [f"EMA_{col}" for col in closing_columns]
+    
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        
+        """
+        Returns:
+            pd.DataFrame: the features, backed by a single float32 array.
+        """
+        
+        closing_columns = get_closing_price_columns(data = X)
+        
+        # The lag columns are found by their suffix, so any pair (or none) may be in their names
+        lag_columns = {int(col.split("_")[-3]): col for col in closing_columns}
+        windows = X[closing_columns].to_numpy(dtype=np.float32)
+        
+        columns = self.get_output_columns(X=X)
+        block = np.empty(shape=(len(X), len(columns)), dtype=np.float32)
+        
+        # Where each group of columns starts in the block
+        start_of_changes = X.shape[1]
+        start_of_rsi = start_of_changes + len(self.percentage_change_days)
+        start_of_ema = start_of_rsi + len(closing_columns)
+        
+        block[:, :start_of_changes] = X.to_numpy(dtype=np.float32)
+        
+        yesterday = X[lag_columns[1]].to_numpy(dtype=np.float32)
+        
+        for i, days in enumerate(self.percentage_change_days):
+            
+            days_ago = X[lag_columns[days]].to_numpy(dtype=np.float32)
+            block[:, start_of_changes + i] = 100*(yesterday - days_ago)/days_ago
+        
+        block[:, start_of_rsi:start_of_ema] = self.compute_rsi(windows=windows)
+        block[:, start_of_ema:] = self.compute_ema(windows=windows)
+        
+        block[np.isnan(block)] = 50
+        
+        return pd.DataFrame(block, columns=columns, index=X.index, copy=False)
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+from typing import Callable
+
+
+def rsi(close: pd.Series|pd.DataFrame, length: int = 14) -> pd.Series|pd.DataFrame:
+
+    """
+    The relative strength index, computed as pandas_ta computes it (with Wilder's
+    moving averages of the gains and losses). A dataframe is treated as a collection
+    of separate series (one per column), all of which are handled in the same pass.
+    """
+
+    change = close.diff()
+
+    gains = change.clip(lower=0)
+    losses = (-change).clip(lower=0)
+
+    average_gain = gains.ewm(alpha=1/length, min_periods=length).mean()
+    average_loss = losses.ewm(alpha=1/length, min_periods=length).mean()
+
+    return 100*average_gain/(average_gain + average_loss)
+
+
+def ema(close: pd.Series|pd.DataFrame, length: int = 14) -> pd.Series|pd.DataFrame:
+
+    """
+    The exponential moving average, computed as pandas_ta computes it (seeded with the
+    simple moving average of the first "length" values). A dataframe is treated as a
+    collection of separate series (one per column), all of which are handled in the
+    same pass.
+    """
+
+    if len(close) < length:
+        return close*np.nan
+
+    seeded = close.copy()
+    seeded.iloc[:length - 1] = np.nan
+    seeded.iloc[length - 1] = close.iloc[:length].mean()
+
+    return seeded.ewm(span=length, adjust=False).mean()
+
+
+def windows_are_consecutive(windows: np.ndarray) -> bool:
+
+    """
+    Check whether each row of windows (from oldest to newest) is the previous row moved
+    forward by a single day, as is the case for the output of
+    transform_ts_data_into_features_and_target (with a step size of 1).
+    """
+
+    return np.array_equal(windows[1:, :-1], windows[:-1, 1:], equal_nan=True)
+
+
+def compute_lagged_indicator(
+    windows: np.ndarray,
+    indicator: Callable,
+    **indicator_kwargs
+) -> np.ndarray:
+
+    """
+    Compute an indicator for every lag column of the windows of closing rates.
+
+    When the windows are consecutive, they are all views of the same underlying series
+    of closing rates. In that case, we rebuild that series, compute the indicator over
+    it just once, and window the result in the same way as the closing rates. Column j
+    of row i is then the indicator's value on the day of closing rate (i, j).
+
+    Otherwise, the indicator is computed down the rows of each column (all columns in a
+    single vectorized pass).
+
+    Args:
+        windows: the closing rates, with one window per row, from oldest to newest.
+        indicator: the indicator function (e.g. rsi or ema)
+
+    Returns:
+        np.ndarray: an array with the same shape as the windows.
+    """
+
+    number_of_rows, window_length = windows.shape
+
+    if number_of_rows == 0:
+        return np.empty(windows.shape)
+
+    if windows_are_consecutive(windows=windows):
+
+        series = pd.Series(
+            np.concatenate([windows[0], windows[1:, -1]])
+        )
+
+        values = indicator(series, **indicator_kwargs).to_numpy(dtype=np.float64)
+
+        return np.lib.stride_tricks.sliding_window_view(values, window_shape=window_length)
+
+    return indicator(pd.DataFrame(windows), **indicator_kwargs).to_numpy(dtype=np.float64)
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import uuid
+import threading
+
+import pandas as pd
+
+from pathlib import Path
+from typing import List, Optional
+
+from src.config import settings
+from src.paths import OHLC_STORE_DIR, SYNTHETIC_OHLC_STORE_DIR
+from src.logger import get_console_logger
+
+try:
+    import fcntl
+
+# There are no POSIX file locks on Windows, so the store is only guarded within a process there
+except ImportError:
+    fcntl = None
+
+
+logger = get_console_logger()
+
+
+class StoreLock:
+
+    """
+    Guards the store's manifest and part files: between the threads of a process, with
+    a re-entrant lock, and between processes (the daily job compacts the store while
+    the API server reads it), with an exclusive lock on a file in the store's directory.
+    The file is only locked by the outermost acquisition of each process.
+    """
+
+    def __init__(self, path: Path):
+
+        self.path = Path(path)
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self) -> "StoreLock":
+
+        self.thread_lock.acquire()
+
+        try:
+
+            if self.depth == 0 and fcntl is not None:
+
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.file = open(self.path, "a")
+
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+
+        except BaseException:
+
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+            self.thread_lock.release()
+            raise
+
+        self.depth += 1
+
+        return self
+
+    def __exit__(self, *exception) -> None:
+
+        self.depth -= 1
+
+        if self.depth == 0 and self.file is not None:
+
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+        self.thread_lock.release()
+
+
+class OHLCStore:
+
+    """
+    An append-only store of daily OHLC data, partitioned by pair, year and month:
+
+        {store_dir}/pair=GBPGHS/year=2024/month=03/part-<id>.parquet
+
+    A small JSON manifest records the files that make up each partition, along with
+    the first and last dates that have been stored for each pair. Readers go through
+    the manifest (never through a directory listing), so files which are still being
+    written, or which are left over from an interrupted compaction, are never read.
+
+    Updates only write new part files for the months that they touch. Compaction
+    merges the part files of each month into one file, and can run in the background.
+
+    The manifest is only read, changed and written (and part files are only read or 
+    deleted) under the store's lock (see StoreLock), which also holds across processes.
+    """
+
+    def __init__(self, store_dir: Path = OHLC_STORE_DIR):
+
+        self.store_dir = Path(store_dir)
+        self.manifest_path = self.store_dir/"manifest.json"
+        self.lock = StoreLock(path=self.store_dir/"store.lock")
+
+    def load_manifest(self) -> dict:
+
+        if self.manifest_path.exists():
+
+            with open(self.manifest_path, "r") as file:
+                return json.load(file)
+
+        return {"pairs": {}}
+
+    def save_manifest(self, manifest: dict) -> None:
+
+        temporary_path = self.manifest_path.with_suffix(".json.tmp")
+
+        with open(temporary_path, "w") as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+
+        os.replace(temporary_path, self.manifest_path)
+
+    def has_pair(self, pair: str) -> bool:
+
+        return pair in self.load_manifest()["pairs"]
+
+    def get_last_date(self, pair: str) -> Optional[str]:
+
+        """ Returns the last date (as a "%Y-%m-%d" string) on which we have data on the pair """
+
+        pair_entry = self.load_manifest()["pairs"].get(pair)
+
+        if pair_entry is not None:
+            return pair_entry["last_date"]
+
+    def get_stored_dates(self, pair: str) -> pd.Series:
+
+        """ Returns every date on which we have data on the pair, in order. """
+
+        return self.read(pair=pair, columns=["Date"])["Date"]
+
+    def make_part_path(self, pair: str, month: str) -> str:
+
+        """ Returns the path (relative to the store's directory) of a new part file. """
+
+        year, month_number = month.split("-")
+
+        return f"pair={pair}/year={year}/month={month_number}/part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+
+    def append(self, pair: str, dataframe: pd.DataFrame) -> None:
+
+        """
+        Write the rows of the dataframe into new part files (one per month that the
+        rows fall in), and then register those files in the manifest.
+
+        Args:
+            pair: the currency pair (e.g. "GBPGHS")
+            dataframe: the OHLC data of the pair, as produced by get_daily_ohlc
+        """
+
+        if dataframe.empty:
+            return
+
+        written = {}
+
+        for month, rows in dataframe.groupby(dataframe["Date"].str[:7], sort=True):
+
+            relative_path = self.make_part_path(pair=pair, month=month)
+            full_path = self.store_dir/relative_path
+
+            full_path.parent.mkdir(parents=True, exist_ok=True)
+            rows.reset_index(drop=True).to_parquet(path=full_path, index=False)
+
+            written[month] = relative_path
+
+        with self.lock:
+
+            manifest = self.load_manifest()
+
+            pair_entry = manifest["pairs"].setdefault(
+                pair, {"first_date": None, "last_date": None, "partitions": {}}
+            )
+
+            for month, relative_path in written.items():
+                pair_entry["partitions"].setdefault(month, []).append(relative_path)
+
+            first_date, last_date = dataframe["Date"].min(), dataframe["Date"].max()
+
+            pair_entry["first_date"] = min(filter(None, [pair_entry["first_date"], first_date]))
+            pair_entry["last_date"] = max(filter(None, [pair_entry["last_date"], last_date]))
+
+            self.save_manifest(manifest=manifest)
+
+        logger.info(f"Stored {len(dataframe)} rows of {pair} data in {len(written)} partition(s)")
+
+    def read(self, pair: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+
+        """
+        Read all the data on the pair that has been registered in the manifest. If the
+        same date was appended more than once, the most recently appended row is kept.
+
+        The lock is held while the files are read, as a compaction (which may be running
+        in the background, or in another process) deletes the part files that it has merged.
+
+        Returns:
+            pd.DataFrame: the OHLC data of the pair, in date order.
+        """
+
+        with self.lock:
+
+            pair_entry = self.load_manifest()["pairs"].get(pair)
+
+            if pair_entry is None:
+                return pd.DataFrame()
+
+            paths = [
+                self.store_dir/relative_path
+                for month in sorted(pair_entry["partitions"]) for relative_path in pair_entry["partitions"][month]
+            ]
+
+            dataframe = pd.concat(
+                [pd.read_parquet(path, columns=columns) for path in paths]
+            )
+
+        return dataframe.drop_duplicates(subset="Date", keep="last").sort_values(by="Date").reset_index(drop=True)
+
+    def compact(self, pair: str) -> None:
+
+        """
+        Merge the part files of every month of the pair's data that has more than one
+        part file into a single file. The merged file is registered in the manifest
+        before the old files are deleted, so readers never see a missing partition.
+        """
+
+        with self.lock:
+
+            partitions = self.load_manifest()["pairs"].get(pair, {}).get("partitions", {})
+
+            for month, relative_paths in partitions.items():
+
+                if len(relative_paths) < 2:
+                    continue
+
+                merged = pd.concat(
+                    [pd.read_parquet(self.store_dir/relative_path) for relative_path in relative_paths]
+                )
+
+                merged = merged.drop_duplicates(subset="Date", keep="last").sort_values(by="Date")
+
+                merged_path = self.make_part_path(pair=pair, month=month)
+                (self.store_dir/merged_path).parent.mkdir(parents=True, exist_ok=True)
+                merged.reset_index(drop=True).to_parquet(path=self.store_dir/merged_path, index=False)
+
+                manifest = self.load_manifest()
+                manifest["pairs"][pair]["partitions"][month] = [merged_path]
+                self.save_manifest(manifest=manifest)
+
+                for relative_path in relative_paths:
+                    (self.store_dir/relative_path).unlink(missing_ok=True)
+
+    def compact_in_background(self, pair: str) -> threading.Thread:
+
+        """
+        Run the compaction of the pair's data in a separate thread. The thread is not
+        a daemon, so the program will wait for it to finish before exiting.
+        """
+
+        thread = threading.Thread(target=self.compact, kwargs={"pair": pair}, name=f"compact-{pair}")
+        thread.start()
+
+        return thread
+
+
+ohlc_store = OHLCStore(store_dir=SYNTHETIC_OHLC_STORE_DIR if settings.use_synthetic_data else OHLC_STORE_DIR)
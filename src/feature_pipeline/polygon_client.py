@@ -0,0 +1,126 @@
+import time
+import threading
+import requests
+
+from typing import Optional
+from requests.adapters import HTTPAdapter
+
+from src.config import settings
+from src.logger import get_console_logger
+
+
+logger = get_console_logger()
+
+POLYGON_BASE_URL = "https://api.polygon.io"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+
+    """
+    A thread-safe token bucket which we use to keep the total rate of requests
+    (across every worker thread) within the limits of our Polygon plan. Tokens
+    are added at a fixed rate, and each request has to take one before it is sent.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+
+        """ Block until a token is available, and then take it. """
+
+        while True:
+
+            with self.lock:
+
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill)*self.rate)
+                self.last_refill = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens)/self.rate
+
+            time.sleep(wait)
+
+
+def make_session(pool_size: int = settings.polygon_max_concurrency) -> requests.Session:
+
+    """
+    Make a session whose connection pool is large enough for all the worker threads,
+    so that every request reuses a kept-alive connection instead of opening a new one.
+    """
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+
+    return session
+
+
+session = make_session()
+rate_limiter = TokenBucket(rate=settings.polygon_requests_per_second)
+
+
+def get_with_retries(
+    url: str,
+    params: Optional[dict] = None,
+    max_retries: int = settings.polygon_max_retries,
+    backoff_factor: float = settings.polygon_backoff_factor
+) -> Optional[requests.Response]:
+
+    """
+    Send a rate-limited GET request through the shared session. Rate limiting (429)
+    responses, server errors and dropped connections are retried with exponential
+    backoff (or after the "Retry-After" interval, if Polygon sends one).
+
+    Args:
+        url: the URL of the endpoint.
+        params: query parameters to be sent with the request.
+        max_retries: the number of retries to make before giving up.
+        backoff_factor: the base of the exponential backoff, in seconds.
+
+    Returns:
+        Optional[requests.Response]: the response if the request succeeded, and None
+                                     otherwise.
+    """
+
+    for attempt in range(max_retries + 1):
+
+        rate_limiter.acquire()
+
+        try:
+            response = session.get(url, params=params, timeout=settings.polygon_timeout)
+
+        except (requests.ConnectionError, requests.Timeout) as error:
+
+            response = None
+            logger.warning(f"Request failed ({error})")
+
+        if response is not None:
+
+            if response.status_code == 200:
+                return response
+
+            elif response.status_code not in RETRYABLE_STATUS_CODES:
+
+                logger.error(f"Error {response.status_code} - {response.text}")
+                return None
+
+        if attempt < max_retries:
+
+            retry_after = response.headers.get("Retry-After") if response is not None else None
+            wait = float(retry_after) if retry_after and retry_after.isdigit() else backoff_factor*2**attempt
+
+            logger.warning(f"Retrying in {wait:.1f}s (attempt {attempt + 1} of {max_retries})")
+            time.sleep(wait)
+
+    logger.error(f"Giving up on {url} after {max_retries} retries")
@@ -0,0 +1,118 @@
+import os
+import gzip
+import threading
+
+from pathlib import Path
+from typing import Optional
+from datetime import datetime
+
+from src.config import settings
+from src.paths import RESPONSE_CACHE_DIR
+from src.logger import get_console_logger
+
+
+logger = get_console_logger()
+
+
+class ResponseCache:
+
+    """
+    A local cache of the raw (gzipped) JSON that Polygon's grouped FX endpoint returns,
+    with one file per trading date. Re-extracting data (for another pair, or another
+    column) and resuming crashed backfills can then be done from disk, and offline.
+
+    The cache is bounded in size. Once it grows beyond max_bytes, the least recently
+    used responses are evicted (reading a response refreshes its modification time)
+    until it is back down to 90% of max_bytes, so that we don't rescan the cache on
+    every subsequent write.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path = RESPONSE_CACHE_DIR,
+        max_bytes: int = settings.response_cache_max_bytes
+    ):
+
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.size = None
+
+    def get_path(self, date: datetime) -> Path:
+
+        return self.cache_dir/f"{date.strftime('%Y-%m-%d')}.json.gz"
+
+    def get(self, date: datetime) -> Optional[bytes]:
+
+        """
+        Returns:
+            Optional[bytes]: the raw JSON of the response on the given date, or None
+                             if it has not been cached.
+        """
+
+        path = self.get_path(date=date)
+
+        try:
+
+            with gzip.open(path, "rb") as file:
+                content = file.read()
+
+            os.utime(path)
+            return content
+
+        except FileNotFoundError:
+            return None
+
+        except (OSError, EOFError):
+
+            logger.warning(f"Discarding the corrupt cached response at {path}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def put(self, date: datetime, content: bytes) -> None:
+
+        """ Compress and save the raw JSON of the response on the given date. """
+
+        path = self.get_path(date=date)
+        temporary_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+
+        with gzip.open(temporary_path, "wb") as file:
+            file.write(content)
+
+        # Renaming is atomic, so a crash mid-write never leaves a truncated response behind
+        os.replace(temporary_path, path)
+
+        with self.lock:
+
+            if self.size is None:
+                self.size = self.get_total_size()
+            else:
+                self.size += path.stat().st_size
+
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def get_total_size(self) -> int:
+
+        return sum(path.stat().st_size for path in self.cache_dir.glob("*.json.gz"))
+
+    def evict(self) -> None:
+
+        """ Delete the least recently used responses until the cache is at 90% of max_bytes """
+
+        target_size = 0.9*self.max_bytes
+        paths = sorted(self.cache_dir.glob("*.json.gz"), key=lambda path: path.stat().st_mtime)
+        self.size = self.get_total_size()
+
+        for path in paths:
+
+            if self.size <= target_size:
+                break
+
+            self.size -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+        logger.info(f"Evicted old responses from the cache, which now holds {self.size/1024**2:.1f}MB")
+
+
+response_cache = ResponseCache()
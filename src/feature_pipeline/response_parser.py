@@ -0,0 +1,114 @@
+import re
+import json
+
+from typing import Dict, Iterable, NamedTuple, Optional
+
+
+# Matches the ticker field of each result in the grouped response, e.g. "T":"C:GBPGHS"
+ANY_TICKER = re.compile(rb'"T"\s*:\s*"([^"]+)"')
+
+
+class OHLCBar(NamedTuple):
+
+    """ The OHLC data of a single ticker on a single day """
+
+    o: float
+    h: float
+    l: float  # noqa: E741
+    c: float
+
+
+def has_results(content: bytes) -> bool:
+    """
+    Responses for days on which Polygon has no data yet come back with a 200 status,
+    but without any results. We look for the first ticker field in the raw JSON, so
+    that the response doesn't have to be parsed.
+
+    Returns:
+        bool: True if the response has the results of at least one ticker.
+    """
+
+    return ANY_TICKER.search(content) is not None
+
+
+def index_results_by_ticker(response: dict) -> Dict[str, dict]:
+    """
+    The grouped endpoint returns the OHLC data of every FX ticker for the day. Index
+    all of them by ticker (e.g. "C:GBPGHS") in a single pass, so that any number of
+    pairs can be looked up from the same response.
+
+    Returns:
+        Dict[str, dict]: the results of each ticker, keyed by the ticker.
+    """
+
+    if "results" in response.keys():
+
+        return {results["T"]: results for results in response["results"]}
+
+    return {}
+
+
+def get_bars(response: dict, tickers: Optional[Iterable[str]] = None) -> Dict[str, OHLCBar]:
+    """
+    Get the OHLC bars of the requested tickers out of an API response which has
+    already been parsed into a dictionary.
+
+    Args:
+        response: the parsed API response
+        tickers: the tickers we want (e.g. ["C:GBPGHS"]), or None for all of them.
+
+    Returns:
+        Dict[str, OHLCBar]: the bar of each requested ticker that is in the response.
+    """
+
+    indexed_results = index_results_by_ticker(response=response)
+
+    if tickers is not None:
+        indexed_results = {ticker: indexed_results[ticker] for ticker in tickers if ticker in indexed_results}
+
+    return {
+        ticker: OHLCBar(o=results["o"], h=results["h"], l=results["l"], c=results["c"])
+        for ticker, results in indexed_results.items()
+    }
+
+
+def parse_bars(content: bytes, tickers: Optional[Iterable[str]] = None) -> Dict[str, OHLCBar]:
+    """
+    Get the OHLC bars of the requested tickers straight out of the raw JSON of an API
+    response, without parsing the whole response.
+
+    Every result in the grouped response is a flat JSON object, so we can search the
+    raw bytes for the ticker fields that we want (which happens in C, via re), find
+    the braces that enclose each of them, and then decode just those few objects. The
+    hundreds of other tickers are never turned into Python objects.
+
+    Args:
+        content: the raw JSON of the API response
+        tickers: the tickers we want (e.g. ["C:GBPGHS"]), or None for all of them.
+
+    Returns:
+        Dict[str, OHLCBar]: the bar of each requested ticker that is in the response.
+    """
+
+    if tickers is None:
+        pattern = ANY_TICKER
+
+    elif not tickers:
+        return {}
+
+    else:
+        alternatives = b"|".join(re.escape(ticker.encode()) for ticker in tickers)
+        pattern = re.compile(rb'"T"\s*:\s*"(' + alternatives + rb')"')
+
+    bars = {}
+
+    for match in pattern.finditer(content):
+
+        start = content.rfind(b"{", 0, match.start())
+        end = content.find(b"}", match.end()) + 1
+
+        results = json.loads(content[start:end])
+
+        bars[match.group(1).decode()] = OHLCBar(o=results["o"], h=results["h"], l=results["l"], c=results["c"])
+
+    return bars
@@ -0,0 +1,393 @@
+import json
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from collections import deque
+from typing import List, Optional, Sequence
+
+from src.paths import FEATURE_STATE_DIR
+from src.feature_pipeline.ohlc_store import ohlc_store
+from src.logger import get_console_logger
+
+
+logger = get_console_logger()
+
+PERCENTAGE_CHANGE_DAYS = [2, 5, 14, 30]
+
+
+class StreamingRSI:
+
+    """
+    A version of the RSI that is updated with one closing rate at a time. Wilder's moving
+    averages of the gains and losses are kept as the running numerators and denominator
+    of pandas' (adjusted) exponentially weighted mean, so that the values agree with
+    those computed over the whole series by src.feature_pipeline.indicators.rsi.
+    """
+
+    def __init__(self, length: int = 14):
+
+        self.length = length
+        self.last_close = None
+        self.gain_numerator = 0.0
+        self.loss_numerator = 0.0
+        self.denominator = 0.0
+        self.observations = 0
+
+    def update(self, close: float) -> float:
+
+        """ Add a closing rate, and return the RSI (or NaN, if there are too few closing rates yet) """
+
+        if self.last_close is not None:
+
+            change = close - self.last_close
+            decay = 1 - 1/self.length
+
+            self.gain_numerator = max(change, 0.0) + decay*self.gain_numerator
+            self.loss_numerator = max(-change, 0.0) + decay*self.loss_numerator
+            self.denominator = 1 + decay*self.denominator
+            self.observations += 1
+
+        self.last_close = close
+
+        return self.value
+
+    @property
+    def value(self) -> float:
+
+        if self.observations < self.length:
+            return np.nan
+
+        average_gain = self.gain_numerator/self.denominator
+        average_loss = self.loss_numerator/self.denominator
+
+        if average_gain + average_loss == 0:
+            return np.nan
+
+        return 100*average_gain/(average_gain + average_loss)
+
+
+class StreamingEMA:
+
+    """
+    A version of the EMA that is updated with one closing rate at a time. As in
+    src.feature_pipeline.indicators.ema, it is seeded with the simple moving average
+    of the first "length" closing rates.
+    """
+
+    def __init__(self, length: int = 14):
+
+        self.length = length
+        self.seed_total = 0.0
+        self.observations = 0
+        self.last_ema = np.nan
+
+    def update(self, close: float) -> float:
+
+        """ Add a closing rate, and return the EMA (or NaN, if there are too few closing rates yet) """
+
+        self.observations += 1
+
+        if self.observations < self.length:
+            self.seed_total += close
+
+        elif self.observations == self.length:
+            self.last_ema = (self.seed_total + close)/self.length
+
+        else:
+            alpha = 2/(self.length + 1)
+            self.last_ema = alpha*close + (1 - alpha)*self.last_ema
+
+        return self.last_ema
+
+
+class StreamingFeatures:
+
+    """
+    Keeps a snapshot of everything needed to produce the latest row of features (as
+    made by get_preprocessing_pipeline), and brings it up to date with each new closing
+    rate in constant time:
+
+    - ring buffers of the last input_seq_len closing rates, RSI values and EMA values
+    - the state of the RSI (Wilder's averages) and the EMA (the last EMA)
+
+    The snapshot can be saved to (and loaded from) a JSON file, so that daily refreshes
+    and live feature generation don't need to go through the whole history again.
+    """
+
+    def __init__(
+        self,
+        rsi_length: int = 14,
+        ema_length: int = 14,
+        input_seq_len: int = 30,
+        base_currency: str = "GBP",
+        target_currency: str = "GHS"
+    ):
+
+        self.rsi_length = rsi_length
+        self.ema_length = ema_length
+        self.input_seq_len = input_seq_len
+        self.pair = f"{base_currency}{target_currency}"
+
+        self.rsi = StreamingRSI(length=rsi_length)
+        self.ema = StreamingEMA(length=ema_length)
+
+        self.closes = deque(maxlen=input_seq_len)
+        self.rsi_values = deque(maxlen=input_seq_len)
+        self.ema_values = deque(maxlen=input_seq_len)
+        self.last_date = None
+
+    def update(self, close: float, date: Optional[str] = None) -> None:
+
+        """ Add the closing rate of a new day """
+
+        # The windows that the models are trained on are float32
+        close = float(np.float32(close))
+
+        self.closes.append(close)
+        self.rsi_values.append(self.rsi.update(close))
+        self.ema_values.append(self.ema.update(close))
+        self.last_date = date
+
+    def update_many(self, closes: Sequence[float], dates: Optional[Sequence[str]] = None) -> None:
+
+        dates = dates if dates is not None else [None]*len(closes)
+
+        for close, date in zip(closes, dates):
+            self.update(close=close, date=date)
+
+    @property
+    def is_ready(self) -> bool:
+
+        return len(self.closes) == self.input_seq_len
+
+    def get_feature_names(self) -> List[str]:
+
+        closing_columns = [
+            f"Closing_rate_{self.pair}_{i + 1}_day_ago" for i in reversed(range(self.input_seq_len))
+        ]
+
+        return closing_columns + [
+            f"percentage_change_between_yesterday_and_{days}_days_ago" for days in PERCENTAGE_CHANGE_DAYS
+        ] + [f"RSI_{column}" for column in closing_columns] + [f"EMA_{column}" for column in closing_columns]
+
+    def get_latest_features(self) -> pd.DataFrame:
+
+        """
+        Returns:
+            pd.DataFrame: a single row of features, made from the latest input_seq_len
+                          closing rates (with the latest being "1 day ago").
+        """
+
+        if not self.is_ready:
+            raise ValueError(f"At least {self.input_seq_len} closing rates are needed to make features")
+
+        closes = np.array(self.closes, dtype=np.float32)
+
+        percentage_changes = [
+            100*(closes[-1] - closes[-days])/closes[-days] for days in PERCENTAGE_CHANGE_DAYS
+        ]
+
+        row = np.concatenate(
+            [closes, percentage_changes, np.array(self.rsi_values), np.array(self.ema_values)]
+        )
+
+        features = pd.DataFrame([row], columns=self.get_feature_names())
+
+        return features.fillna(50)
+
+    def to_dict(self) -> dict:
+
+        return {
+            "rsi_length": self.rsi_length,
+            "ema_length": self.ema_length,
+            "input_seq_len": self.input_seq_len,
+            "pair": self.pair,
+            "last_date": self.last_date,
+            "rsi": vars(self.rsi),
+            "ema": vars(self.ema),
+            "closes": list(self.closes),
+            "rsi_values": list(self.rsi_values),
+            "ema_values": list(self.ema_values)
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "StreamingFeatures":
+
+        features = cls(
+            rsi_length=state["rsi_length"],
+            ema_length=state["ema_length"],
+            input_seq_len=state["input_seq_len"],
+            base_currency=state["pair"][:3],
+            target_currency=state["pair"][3:]
+        )
+
+        vars(features.rsi).update(state["rsi"])
+        vars(features.ema).update(state["ema"])
+
+        features.closes.extend(state["closes"])
+        features.rsi_values.extend(state["rsi_values"])
+        features.ema_values.extend(state["ema_values"])
+        features.last_date = state["last_date"]
+
+        return features
+
+    def save(self, path: Optional[Path] = None) -> Path:
+
+        path = path if path is not None else get_feature_state_path(
+            pair=self.pair, rsi_length=self.rsi_length, ema_length=self.ema_length
+        )
+
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file)
+
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "StreamingFeatures":
+
+        with open(path, "r") as file:
+            return cls.from_dict(state=json.load(file))
+
+
+def get_feature_state_path(pair: str, rsi_length: int, ema_length: int) -> Path:
+
+    """ Each pair has a saved state for each pair of indicator lengths that a model uses """
+
+    return FEATURE_STATE_DIR/f"{pair}_rsi_{rsi_length}_ema_{ema_length}_feature_state.json"
+
+
+def refresh_streaming_features(
+    rates: pd.DataFrame,
+    rsi_length: int = 14,
+    ema_length: int = 14,
+    base_currency: str = "GBP",
+    target_currency: str = "GHS"
+) -> StreamingFeatures:
+
+    """
+    Bring the saved feature state of the pair up to date with the days in "rates" that
+    it has not seen yet, and save it. Only the new days are processed, so the cost does
+    not depend on the length of the history. If there is no saved state with these 
+    indicator lengths, it is built from the whole of "rates".
+
+    The latest row of features is not made here, as a pair with a short history may
+    not have enough closing rates for one yet (see StreamingFeatures.is_ready).
+
+    Args:
+        rates: the OHLC data of the pair, as returned by update_ohlc
+
+    Returns:
+        StreamingFeatures: the updated state.
+    """
+
+    pair = f"{base_currency}{target_currency}"
+    path = get_feature_state_path(pair=pair, rsi_length=rsi_length, ema_length=ema_length)
+
+    state = StreamingFeatures.load(path) if path.exists() else None
+
+    if state is None:
+
+        logger.info("Building the feature state from the whole history")
+
+        state = StreamingFeatures(
+            rsi_length=rsi_length,
+            ema_length=ema_length,
+            base_currency=base_currency,
+            target_currency=target_currency
+        )
+
+    new_rates = rates.sort_values(by="Date")
+
+    if state.last_date is not None:
+        new_rates = new_rates[new_rates["Date"] > state.last_date]
+
+    logger.info(f"Adding {len(new_rates)} day(s) to the feature state")
+
+    state.update_many(
+        closes=new_rates[f"Closing_rate_{pair}"].tolist(),
+        dates=new_rates["Date"].tolist()
+    )
+
+    state.save(path=path)
+
+    return state
+
+
+def refresh_saved_streaming_features(
+    rates: pd.DataFrame,
+    base_currency: str = "GBP",
+    target_currency: str = "GHS",
+    rebuild: bool = False
+) -> None:
+
+    """
+    Bring every saved feature state of the pair (one for each pair of indicator lengths
+    in use) up to date with the new days in "rates". This runs with each update of the
+    OHLC data, so the states advance one bar at a time. If the pair has no saved state
+    yet, one is built with the default indicator lengths.
+
+    Args:
+        rebuild: whether to build the states again from the whole of "rates" (as when
+                 gaps in the history have been filled, which the states can't take in).
+    """
+
+    pair = f"{base_currency}{target_currency}"
+    paths = sorted(FEATURE_STATE_DIR.glob(f"{pair}_rsi_*_ema_*_feature_state.json"))
+
+    lengths = [
+        (state.rsi_length, state.ema_length) for state in map(StreamingFeatures.load, paths)
+    ] if paths else [(14, 14)]
+
+    if rebuild:
+
+        for path in paths:
+            path.unlink()
+
+    for rsi_length, ema_length in lengths:
+
+        refresh_streaming_features(
+            rates=rates,
+            rsi_length=rsi_length,
+            ema_length=ema_length,
+            base_currency=base_currency,
+            target_currency=target_currency
+        )
+
+
+def get_latest_features(
+    rsi_length: int = 14,
+    ema_length: int = 14,
+    base_currency: str = "GBP",
+    target_currency: str = "GHS"
+) -> pd.DataFrame:
+
+    """
+    Read the latest row of features from the saved state, without going through the
+    history. A model whose indicator lengths have no saved state yet gets one, built
+    (once) from the OHLC store.
+
+    Returns:
+        pd.DataFrame: the features that a model needs to predict the next closing rate.
+
+    Raises:
+        ValueError: if there are too few closing rates of the pair to make features.
+    """
+
+    pair = f"{base_currency}{target_currency}"
+    path = get_feature_state_path(pair=pair, rsi_length=rsi_length, ema_length=ema_length)
+
+    if path.exists():
+        state = StreamingFeatures.load(path)
+
+    else:
+
+        state = refresh_streaming_features(
+            rates=ohlc_store.read(pair=pair),
+            rsi_length=rsi_length,
+            ema_length=ema_length,
+            base_currency=base_currency,
+            target_currency=target_currency
+        )
+
+    return state.get_latest_features()
@@ -0,0 +1,138 @@
+import zlib
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+from typing import Dict, List, Sequence
+
+from src.config import settings
+from src.logger import get_console_logger
+
+
+logger = get_console_logger()
+
+# Every path starts here, so that any date has the same rate whichever span it is requested in
+SYNTHETIC_EPOCH = datetime(1900, 1, 1)
+
+# Daily GARCH(1, 1) parameters, in the range of those estimated for exchange rates
+GARCH_OMEGA = 2e-7
+GARCH_ALPHA = 0.08
+GARCH_BETA = 0.9
+DAILY_DRIFT = 5e-5
+
+
+def get_pair_rng(pair: str, seed: int = settings.synthetic_seed, stream: int = 0) -> np.random.Generator:
+
+    """
+    Each part of a pair's data (the shocks, the gaps, and so on) is drawn from a stream
+    of its own. The first n numbers of a stream are then the same however many are
+    drawn, so a longer path always starts with the shorter one.
+
+    Returns:
+        np.random.Generator: a generator that always produces the same numbers for the
+                             same pair, seed and stream (unlike the built-in hash, crc32
+                             is not salted differently for each process).
+    """
+
+    return np.random.default_rng([zlib.crc32(pair.encode()), seed, stream])
+
+
+def simulate_log_returns(rng: np.random.Generator, days: int) -> np.ndarray:
+
+    """
+    Simulate daily log returns whose volatility follows a GARCH(1, 1) process, so that
+    calm and turbulent periods cluster together, as they do in real exchange rates.
+    Shocks are drawn from a Student's t distribution (with 5 degrees of freedom, scaled
+    to unit variance), which gives the heavy tails of real returns.
+    """
+
+    shocks = rng.standard_t(df=5, size=days)/np.sqrt(5/3)
+    returns = np.empty(days)
+
+    variance = GARCH_OMEGA/(1 - GARCH_ALPHA - GARCH_BETA)
+    last_return = 0.0
+
+    for day in range(days):
+
+        variance = GARCH_OMEGA + GARCH_ALPHA*last_return**2 + GARCH_BETA*variance
+        last_return = np.sqrt(variance)*shocks[day]
+        returns[day] = last_return
+
+    return returns + DAILY_DRIFT
+
+
+def generate_pair_ohlc(
+    pair: str,
+    dates: Sequence[datetime],
+    seed: int = settings.synthetic_seed,
+    gap_probability: float = settings.synthetic_gap_probability
+) -> pd.DataFrame:
+
+    """
+    Make OHLC data for a pair on the given dates, with the same columns as the data that
+    get_daily_ohlc downloads. The path is simulated from SYNTHETIC_EPOCH, and is fixed by
+    the pair and the seed, so the rate on a date doesn't depend on the other dates that
+    are asked for (and incremental updates line up with earlier downloads).
+
+    A fraction (gap_probability) of the dates is left out at random, as Polygon has no
+    data for some trading days.
+
+    Returns:
+        pd.DataFrame: the OHLC data, in date order.
+    """
+
+    dates = pd.DatetimeIndex(dates).normalize()
+
+    if len(dates) == 0:
+        return pd.DataFrame()
+
+    calendar = pd.date_range(start=SYNTHETIC_EPOCH, end=dates.max(), freq="D")
+    positions = calendar.get_indexer(dates)
+    days = len(calendar)
+
+    rngs = [get_pair_rng(pair=pair, seed=seed, stream=stream) for stream in range(7)]
+
+    initial_rate = 10**rngs[0].uniform(-1, 2)
+    log_returns = simulate_log_returns(rng=rngs[1], days=days)
+
+    # Each day opens near the previous day's close, and the high and low lie beyond both
+    closes = initial_rate*np.exp(np.cumsum(log_returns))
+    opens = np.concatenate([[initial_rate], closes[:-1]])*np.exp(rngs[2].normal(0, 1e-4, days))
+
+    ranges = np.abs(log_returns) + np.abs(rngs[3].normal(0, 2e-3, days))
+    highs = np.maximum(opens, closes)*np.exp(ranges*rngs[4].uniform(0.2, 1, days))
+    lows = np.minimum(opens, closes)*np.exp(-ranges*rngs[5].uniform(0.2, 1, days))
+
+    has_data = rngs[6].uniform(size=days) >= gap_probability
+    keep = positions[(positions >= 0) & has_data[positions]]
+
+    return pd.DataFrame(
+        {
+            "Date": calendar[keep].strftime("%Y-%m-%d"),
+            f"Opening_rate_{pair}": opens[keep],
+            f"Peak_rate_{pair}": highs[keep],
+            f"Lowest_rate_{pair}": lows[keep],
+            f"Closing_rate_{pair}": closes[keep]
+        }
+    )
+
+
+def generate_ohlc(pairs: List[str]|str, dates: Sequence[datetime]) -> Dict[str, pd.DataFrame]:
+
+    """
+    Stands in for download_ohlc when settings.use_synthetic_data is set.
+
+    Args:
+        pairs: currency pairs written as the base currency followed by the target
+               currency (e.g. ["GBPGHS"]), or "all" for the pairs in settings.synthetic_pairs.
+        dates: the (trading) dates on which we want data
+
+    Returns:
+        Dict[str, pd.DataFrame]: the OHLC data (in date order) of each pair.
+    """
+
+    pairs = settings.synthetic_pairs if pairs == "all" else pairs
+
+    logger.info(f"Generating synthetic data for {len(pairs)} pair(s) on {len(dates)} date(s)")
+
+    return {pair: generate_pair_ohlc(pair=pair, dates=dates) for pair in pairs}
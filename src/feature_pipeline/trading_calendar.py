@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+from typing import Tuple
+
+
+# The forex market trades around the clock from 5PM on Sunday to 5PM on Friday (New York time)
+SESSION_TIMEZONE = "America/New_York"
+SESSION_CLOSING_HOUR = 17
+
+# (month, day) of the holidays on which the forex market is closed
+FOREX_HOLIDAYS = [(1, 1), (12, 25)]
+
+# Monday to Friday. Sunday's session only covers the last few hours of the (UTC) day
+SESSION_WEEKMASK = "1111100"
+
+
+def get_holidays(start_date: datetime, end_date: datetime) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: the dates (as datetime64[D]) of all the holidays between the
+                    start and end dates.
+    """
+
+    years = np.arange(start_date.year, end_date.year + 1)
+
+    holidays = np.array(
+        [np.datetime64(f"{year}-{month:02d}-{day:02d}") for year in years for month, day in FOREX_HOLIDAYS],
+        dtype="datetime64[D]"
+    )
+
+    return np.sort(holidays)
+
+
+def get_trading_days(start_date: datetime, end_date: datetime) -> np.ndarray:
+    """
+    Find every day between the start and end dates (inclusive) on which there is a
+    full forex trading session, in a single vectorized pass. Saturdays, Sundays and
+    holidays are left out, as they return no usable data.
+
+    Args:
+        start_date: the first date of the range.
+        end_date: the last date of the range.
+
+    Returns:
+        np.ndarray: the trading days, as datetime64[D]
+    """
+
+    days = np.arange(
+        np.datetime64(pd.Timestamp(start_date).date()),
+        np.datetime64(pd.Timestamp(end_date).date()) + 1,
+        dtype="datetime64[D]"
+    )
+
+    is_session = np.is_busday(
+        days,
+        weekmask=SESSION_WEEKMASK,
+        holidays=get_holidays(start_date=start_date, end_date=end_date)
+    )
+
+    return days[is_session]
+
+
+def get_session_bounds(trading_days: np.ndarray) -> Tuple[pd.DatetimeIndex, pd.DatetimeIndex]:
+    """
+    The session of each trading day opens at 5PM (New York time) on the previous day,
+    and closes at 5PM on the day itself. This is 10PM UTC in the winter (EST), and
+    9PM UTC in the summer (EDT).
+
+    Returns:
+        Tuple[pd.DatetimeIndex, pd.DatetimeIndex]: the opening and closing times (in UTC)
+                                                   of each session.
+    """
+
+    closes = (
+        pd.DatetimeIndex(trading_days) + pd.Timedelta(hours=SESSION_CLOSING_HOUR)
+    ).tz_localize(SESSION_TIMEZONE).tz_convert("UTC")
+
+    opens = (
+        pd.DatetimeIndex(trading_days) - pd.Timedelta(days=1) + pd.Timedelta(hours=SESSION_CLOSING_HOUR)
+    ).tz_localize(SESSION_TIMEZONE).tz_convert("UTC")
+
+    return opens, closes
+
+
+def get_closed_trading_days(start_date: datetime, end_date: datetime) -> np.ndarray:
+    """
+    The trading days between the start and end dates (inclusive) whose sessions have
+    closed. Both the sessions' closing times and the current time are taken in UTC, so
+    the result doesn't depend on the local timezone of the machine.
+
+    Returns:
+        np.ndarray: the trading days, as datetime64[D]
+    """
+
+    trading_days = get_trading_days(start_date=start_date, end_date=end_date)
+    _, closes = get_session_bounds(trading_days=trading_days)
+
+    return trading_days[closes <= pd.Timestamp.now(tz="UTC")]
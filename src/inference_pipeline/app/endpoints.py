@@ -4,7 +4,7 @@ import pandas as pd
 from typing import Any
 
 from comet_ml.exceptions import CometRestApiException
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from fastapi.encoders import jsonable_encoder
 
 from sklearn.linear_model import Lasso 
@@ -15,7 +15,11 @@ from src.config import settings
 from src.paths import MODELS_DIR
 from src.logger import get_console_logger
 from src.inference_pipeline.app.schemas import Health, PredictionResults, MultipleFeatureInputs
+from src.inference_pipeline.compiled_model import load_compiled_model, get_pipeline_steps
+from src.feature_pipeline.streaming_features import get_latest_features
+from src.inference_pipeline.booster_model import load_booster_model
 from src.inference_pipeline.model_registry import load_model_from_registry
+from src.training_pipeline.model_training import get_tuned_model_name
 
 
 logger = get_console_logger()
@@ -34,6 +38,57 @@ def health() -> dict:
   return health.dict()
 
 
+@api_router.get(path="/predict_next_day", response_model=PredictionResults, status_code=200)
+def predict_next_day(
+  model: str,
+  base_currency: str = "GBP",
+  target_currency: str = "GHS"
+  ) -> Any:
+  
+  """
+  Predict the next closing rate of the pair from the latest row of features in the 
+  saved feature state (which the daily update of the OHLC data keeps up to date), 
+  rather than from features sent with the request.
+  """
+  
+  pair = f"{base_currency}{target_currency}"
+  model_name = get_tuned_model_name(model=model, pair=None if pair == "GBPGHS" else pair)
+  
+  try:
+    
+    with open(file=MODELS_DIR/f"{model_name}.pkl", mode="rb") as saved_pkl:
+      
+      pipeline = pickle.load(file=saved_pkl)
+  
+  except FileNotFoundError as no_file:
+    
+    logger.error(no_file)
+    raise HTTPException(status_code=404, detail=f"There is no saved {model_name}")
+  
+  *transformers, estimator = get_pipeline_steps(pipeline=pipeline)
+  
+  # The state must have been made with the indicator lengths that the model was tuned with
+  try:
+    
+    features = get_latest_features(
+      rsi_length=next(step.rsi_length for step in transformers if hasattr(step, "rsi_length")),
+      ema_length=next(step.ema_length for step in transformers if hasattr(step, "ema_length")),
+      base_currency=base_currency,
+      target_currency=target_currency
+    )
+  
+  except ValueError as too_few_rates:
+    
+    logger.error(too_few_rates)
+    raise HTTPException(status_code=404, detail=f"There is not enough data on {pair} to make features yet")
+  
+  prediction = estimator.predict(features)
+  
+  logger.info(f"Prediction: {prediction}")
+  
+  return PredictionResults(prediction=prediction.tolist())
+
+
 @api_router.post(path="/predict", response_model=PredictionResults, status_code=200)
 async def predict(
   input_data: MultipleFeatureInputs, 
@@ -42,9 +97,42 @@ async def predict(
   from_model_registry: bool = False
   ) -> Any:
 
-  input_data = pd.DataFrame(
-    jsonable_encoder(input_data.inputs)
-  )
+  records = jsonable_encoder(input_data.inputs)
+  compiled_model_path = MODELS_DIR/f"Tuned {model} model.npz"
+  
+  # Lasso models that have been compiled at training time are served without sklearn or pandas
+  if not from_model_registry and compiled_model_path.exists():
+    
+    prediction = load_compiled_model(path=compiled_model_path).predict_records(records=records)
+    
+    logger.info(f"Predictions: {prediction}")
+    
+    return PredictionResults(prediction=prediction.tolist())
+  
+  # LightGBM and XGBoost models are served by their boosters, straight from NumPy arrays
+  booster_model_path = MODELS_DIR/f"Tuned {model} model.pkl"
+  
+  if not from_model_registry and model in ["xgboost", "lightgbm"] and booster_model_path.exists():
+    
+    try:
+      booster_model = load_booster_model(path=booster_model_path)
+    
+    # Pipelines that were saved before FeatureAssembler can't be served by their boosters,
+    # so they are left to the pipeline itself (below)
+    except (NotImplementedError, ValueError) as error:
+      
+      logger.warning(f"Serving the {model} pipeline, as its booster can't be used on its own: {error}")
+      booster_model = None
+    
+    if booster_model is not None:
+      
+      prediction = booster_model.predict_records(records=records)
+      
+      logger.info(f"Predictions: {prediction}")
+      
+      return PredictionResults(prediction=prediction.tolist())
+  
+  input_data = pd.DataFrame(records)
   
   logger.info("Making predictions on inputs:")
   
@@ -0,0 +1,114 @@
+import os
+import pickle
+import numpy as np
+
+from pathlib import Path
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import xgboost as xgb
+import lightgbm as lgb
+
+from src.config import settings
+from src.feature_pipeline.feature_engineering import FeatureAssembler
+from src.inference_pipeline.compiled_model import FeatureKernel, get_pipeline_steps, records_to_windows
+
+
+class BoosterModel:
+
+    """
+    Serves a fitted preprocessing + LightGBM (or XGBoost) pipeline through the library's
+    own Booster, which is extracted from the pipeline once, when it is loaded.
+
+    The features are built by FeatureKernel, as a contiguous float32 block, which the
+    boosters read as it is: LightGBM's Booster.predict, and XGBoost's inplace_predict,
+    predict straight from the array's memory, without building a DataFrame, a Dataset or
+    a DMatrix, and without the checks of the sklearn wrappers. So a batch of any size is
+    scored at the speed of the library itself.
+    """
+
+    def __init__(self, booster: lgb.Booster|xgb.Booster, features: FeatureKernel, threads: Optional[int] = None):
+
+        self.booster = booster
+        self.features = features
+        self.threads = threads if threads is not None else (os.cpu_count() or 1)
+
+        if isinstance(booster, xgb.Booster):
+            booster.set_param({"nthread": self.threads})
+
+    @classmethod
+    def from_pipeline(cls, pipeline, threads: Optional[int] = settings.inference_threads) -> "BoosterModel":
+
+        """
+        Raises:
+            NotImplementedError: if the pipeline is not a FeatureAssembler followed by an
+                                 LGBMRegressor or an XGBRegressor.
+        """
+
+        *transformers, estimator = get_pipeline_steps(pipeline=pipeline)
+
+        if len(transformers) != 1 or not isinstance(transformers[0], FeatureAssembler):
+            raise NotImplementedError("Only pipelines of a FeatureAssembler and a booster can be served this way.")
+
+        if isinstance(estimator, lgb.LGBMRegressor):
+
+            booster = estimator.booster_
+            feature_names = booster.feature_name()
+
+        elif isinstance(estimator, xgb.XGBRegressor):
+
+            booster = estimator.get_booster()
+            feature_names = booster.feature_names
+
+        else:
+            raise NotImplementedError("Only LightGBM and XGBoost models can be served this way.")
+
+        # The boosters were fitted on FeatureAssembler's output, which starts with its input columns
+        features = FeatureKernel.from_assembler(
+            assembler=transformers[0],
+            input_columns=[name for name in feature_names if name.startswith("Closing_rate")]
+        )
+
+        if len(feature_names) != features.number_of_features:
+            raise ValueError("The booster was not fitted on the features that FeatureAssembler makes")
+
+        return cls(booster=booster, features=features, threads=threads)
+
+    def predict(self, windows: np.ndarray) -> np.ndarray:
+
+        """
+        Args:
+            windows: the input features, with one row per window, and the columns in the
+                     order of features.input_columns.
+        """
+
+        features = self.features.transform(windows=windows)
+
+        if isinstance(self.booster, xgb.Booster):
+            return self.booster.inplace_predict(features, validate_features=False)
+
+        return self.booster.predict(features, num_threads=self.threads)
+
+    def predict_records(self, records: List[Dict[str, float]]) -> np.ndarray:
+
+        return self.predict(windows=records_to_windows(records=records, input_columns=self.features.input_columns))
+
+
+@lru_cache(maxsize=16)
+def load_cached_booster_model(path: str, modified_time: float) -> BoosterModel:
+
+    with open(path, "rb") as file:
+        pipeline = pickle.load(file)
+
+    return BoosterModel.from_pipeline(pipeline=pipeline)
+
+
+def load_booster_model(path: Path) -> BoosterModel:
+
+    """
+    Load the pickled pipeline, and extract its booster, once per process rather than on
+    every request. A model that has been rewritten (by a retrain) since it was cached is
+    loaded again.
+    """
+
+    return load_cached_booster_model(path=str(path), modified_time=os.path.getmtime(path))
@@ -0,0 +1,340 @@
+import os
+import numpy as np
+
+from pathlib import Path
+from functools import lru_cache
+from typing import Dict, List, Sequence
+
+
+# The exponential means are computed this many rows at a time
+BLOCK_ROWS = 128
+
+
+@lru_cache(maxsize=32)
+def get_decay_matrix(decay: float) -> np.ndarray:
+
+    """
+    Returns:
+        np.ndarray: the lower triangular matrix whose entry (t, i) is decay**(t - i).
+    """
+
+    lags = np.subtract.outer(np.arange(BLOCK_ROWS), np.arange(BLOCK_ROWS))
+    matrix = np.where(lags >= 0, decay**np.maximum(lags, 0), 0.0)
+
+    matrix.setflags(write=False)
+
+    return matrix
+
+
+def exponential_filter(values: np.ndarray, decay: float, scale: float, initial: np.ndarray) -> np.ndarray:
+
+    """
+    Run the recursion s[t] = decay*s[t - 1] + scale*values[t] (starting from s[-1] =
+    initial) down each column of values. Rather than stepping through the rows in
+    Python, we take BLOCK_ROWS rows at a time: within a block, the recursion is a
+    product with the (cached) decay matrix, and the last row of each block is carried
+    into the next one.
+    """
+
+    matrix = get_decay_matrix(decay=decay)
+    carry = decay**np.arange(1, BLOCK_ROWS + 1)
+
+    filtered = np.empty_like(values)
+    state = initial
+
+    for start in range(0, len(values), BLOCK_ROWS):
+
+        block = values[start:start + BLOCK_ROWS]
+        rows = len(block)
+
+        filtered[start:start + rows] = scale*(matrix[:rows, :rows] @ block) + carry[:rows, None]*state
+        state = filtered[start + rows - 1]
+
+    return filtered
+
+
+def ewm_mean(values: np.ndarray, alpha: float, adjust: bool) -> np.ndarray:
+
+    """
+    The exponentially weighted mean of each column of values (down the rows), as pandas'
+    ewm(...).mean() computes it for data without gaps.
+    """
+
+    decay = 1 - alpha
+
+    if adjust:
+
+        numerator = exponential_filter(values=values, decay=decay, scale=1.0, initial=np.zeros(values.shape[1]))
+        denominator = (1 - decay**np.arange(1, len(values) + 1))/alpha
+
+        return numerator/denominator[:, None]
+
+    return exponential_filter(values=values, decay=decay, scale=alpha, initial=values[0])
+
+
+def rsi(close: np.ndarray, length: int = 14) -> np.ndarray:
+
+    """
+    The same relative strength index as src.feature_pipeline.indicators.rsi, for each
+    column of a float32 array of closing rates. The first "length" rows are NaN.
+    """
+
+    rsi_values = np.full(close.shape, np.nan)
+
+    if len(close) <= length:
+        return rsi_values
+
+    # As in pandas, the changes are taken in the precision of the closing rates
+    change = np.diff(close, axis=0).astype(np.float64)
+
+    average_gain = ewm_mean(np.clip(change, 0, None), alpha=1/length, adjust=True)
+    average_loss = ewm_mean(np.clip(-change, 0, None), alpha=1/length, adjust=True)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi_values[1:] = 100*average_gain/(average_gain + average_loss)
+
+    rsi_values[:length] = np.nan
+
+    return rsi_values
+
+
+def ema(close: np.ndarray, length: int = 14) -> np.ndarray:
+
+    """
+    The same exponential moving average as src.feature_pipeline.indicators.ema (seeded
+    with the simple moving average of the first "length" values), for each column of a
+    float32 array of closing rates.
+    """
+
+    ema_values = np.full(close.shape, np.nan)
+
+    if len(close) < length:
+        return ema_values
+
+    close = close.astype(np.float64)
+    seeded = np.concatenate([close[:length].mean(axis=0, keepdims=True), close[length:]])
+
+    ema_values[length - 1:] = ewm_mean(seeded, alpha=2/(length + 1), adjust=False)
+
+    return ema_values
+
+
+def compute_lagged_indicator(windows: np.ndarray, indicator, length: int) -> np.ndarray:
+
+    """ See src.feature_pipeline.indicators.compute_lagged_indicator, which this mirrors """
+
+    window_length = windows.shape[1]
+
+    if np.array_equal(windows[1:, :-1], windows[:-1, 1:], equal_nan=True):
+
+        series = np.concatenate([windows[0], windows[1:, -1]])[:, None]
+        values = indicator(series, length=length)[:, 0]
+
+        return np.lib.stride_tricks.sliding_window_view(values, window_shape=window_length)
+
+    return indicator(windows, length=length)
+
+
+def records_to_windows(records: List[Dict[str, float]], input_columns: List[str]) -> np.ndarray:
+
+    """ Turn the inputs of a request (one dictionary of features for each window) into an array """
+
+    return np.array([[record[column] for column in input_columns] for record in records], dtype=np.float32)
+
+
+class FeatureKernel:
+
+    """
+    Builds the features exactly as FeatureAssembler does, with nothing but NumPy: in one
+    contiguous float32 block, with the same columns in the same order, and with missing
+    values set to 50.
+    """
+
+    def __init__(
+        self,
+        input_columns: Sequence[str],
+        rsi_length: int,
+        ema_length: int,
+        percentage_change_days: Sequence[int]
+    ):
+
+        self.input_columns = [str(column) for column in input_columns]
+        self.rsi_length = int(rsi_length)
+        self.ema_length = int(ema_length)
+        self.percentage_change_days = [int(days) for days in percentage_change_days]
+
+        self.closing_indices = [i for i, column in enumerate(self.input_columns) if column.startswith("Closing_rate")]
+        lag_indices = {int(self.input_columns[i].split("_")[-3]): i for i in self.closing_indices}
+
+        self.yesterday_index = lag_indices[1]
+        self.days_ago_indices = [lag_indices[days] for days in self.percentage_change_days]
+
+        # Where each group of features starts in the block
+        self.start_of_changes = len(self.input_columns)
+        self.start_of_rsi = self.start_of_changes + len(self.percentage_change_days)
+        self.start_of_ema = self.start_of_rsi + len(self.closing_indices)
+        self.number_of_features = self.start_of_ema + len(self.closing_indices)
+
+    @classmethod
+    def from_assembler(cls, assembler, input_columns: Sequence[str]) -> "FeatureKernel":
+
+        return cls(
+            input_columns=input_columns,
+            rsi_length=assembler.rsi_length,
+            ema_length=assembler.ema_length,
+            percentage_change_days=assembler.percentage_change_days
+        )
+
+    def transform(self, windows: np.ndarray, with_rsi: bool = True, with_ema: bool = True) -> np.ndarray:
+
+        """
+        Args:
+            windows: the input features, with one row per window, and the columns in the
+                     order of input_columns.
+            with_rsi: whether to compute the RSI features (otherwise they are left as zeros)
+            with_ema: whether to compute the EMA features (otherwise they are left as zeros)
+
+        Returns:
+            np.ndarray: the features, in the same float32 block as FeatureAssembler's.
+        """
+
+        windows = np.asarray(windows, dtype=np.float32).reshape(-1, len(self.input_columns))
+
+        closing_rates = windows[:, self.closing_indices]
+        block = np.zeros(shape=(len(windows), self.number_of_features), dtype=np.float32)
+
+        block[:, :self.start_of_changes] = windows
+
+        yesterday = windows[:, self.yesterday_index]
+        days_ago = windows[:, self.days_ago_indices]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            block[:, self.start_of_changes:self.start_of_rsi] = 100*(yesterday[:, None] - days_ago)/days_ago
+
+        if len(windows) > 0 and with_rsi:
+
+            block[:, self.start_of_rsi:self.start_of_ema] = compute_lagged_indicator(
+                windows=closing_rates, indicator=rsi, length=self.rsi_length
+            )
+
+        if len(windows) > 0 and with_ema:
+
+            block[:, self.start_of_ema:] = compute_lagged_indicator(
+                windows=closing_rates, indicator=ema, length=self.ema_length
+            )
+
+        block[np.isnan(block)] = 50
+
+        return block
+
+
+def get_pipeline_steps(pipeline) -> list:
+
+    """
+    Returns:
+        list: the steps of a fitted pipeline, with any nested pipelines (such as the
+              preprocessing pipeline) flattened into it. This only looks at the steps, so
+              sklearn doesn't have to be imported.
+    """
+
+    steps = []
+
+    for _, step in pipeline.steps:
+        steps += get_pipeline_steps(step) if hasattr(step, "steps") else [step]
+
+    return steps
+
+
+class CompiledLinearModel:
+
+    """
+    A fitted preprocessing + Lasso pipeline, reduced to its coefficients, its intercept,
+    and the few parameters of its feature engineering (see
+    src.training_pipeline.model_training.export_compiled_model). It needs nothing but
+    NumPy to make predictions, which keeps sklearn, pandas and the DataFrame inserts of
+    the pipeline off the request path.
+
+    Lasso's coefficients are mostly zero, so any group of features (RSI or EMA) whose
+    coefficients are all zero is never computed.
+    """
+
+    def __init__(
+        self,
+        coefficients: np.ndarray,
+        intercept: float,
+        input_columns: Sequence[str],
+        rsi_length: int,
+        ema_length: int,
+        percentage_change_days: Sequence[int]
+    ):
+
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self.intercept = float(intercept)
+
+        self.features = FeatureKernel(
+            input_columns=input_columns,
+            rsi_length=rsi_length,
+            ema_length=ema_length,
+            percentage_change_days=percentage_change_days
+        )
+
+        if len(self.coefficients) != self.features.number_of_features:
+            raise ValueError("The number of coefficients does not match the number of features")
+
+        self.uses_rsi = bool(np.any(self.coefficients[self.features.start_of_rsi:self.features.start_of_ema]))
+        self.uses_ema = bool(np.any(self.coefficients[self.features.start_of_ema:]))
+
+    def predict(self, windows: np.ndarray) -> np.ndarray:
+
+        features = self.features.transform(windows=windows, with_rsi=self.uses_rsi, with_ema=self.uses_ema)
+
+        return features @ self.coefficients + self.intercept
+
+    def predict_records(self, records: List[Dict[str, float]]) -> np.ndarray:
+
+        return self.predict(windows=records_to_windows(records=records, input_columns=self.features.input_columns))
+
+    def save(self, path: Path) -> None:
+
+        # Written as plain arrays, so that loading it never has to unpickle anything
+        with open(path, "wb") as file:
+
+            np.savez(
+                file,
+                coefficients=self.coefficients,
+                intercept=np.array(self.intercept),
+                input_columns=np.array(self.features.input_columns),
+                rsi_length=np.array(self.features.rsi_length),
+                ema_length=np.array(self.features.ema_length),
+                percentage_change_days=np.array(self.features.percentage_change_days)
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "CompiledLinearModel":
+
+        with np.load(path, allow_pickle=False) as artifact:
+
+            return cls(
+                coefficients=artifact["coefficients"],
+                intercept=artifact["intercept"],
+                input_columns=artifact["input_columns"].tolist(),
+                rsi_length=artifact["rsi_length"],
+                ema_length=artifact["ema_length"],
+                percentage_change_days=artifact["percentage_change_days"].tolist()
+            )
+
+
+@lru_cache(maxsize=16)
+def load_cached_model(path: str, modified_time: float) -> CompiledLinearModel:
+
+    return CompiledLinearModel.load(path=Path(path))
+
+
+def load_compiled_model(path: Path) -> CompiledLinearModel:
+
+    """
+    Load a compiled model once per process, rather than on every request. A model that
+    has been rewritten (by a retrain) since it was cached is loaded again.
+    """
+
+    return load_cached_model(path=str(path), modified_time=os.path.getmtime(path))
@@ -5,12 +5,23 @@ PARENT_DIR = Path(__file__).parent.resolve().parent
 MODELS_DIR = PARENT_DIR/"models"
 DATA_DIR = PARENT_DIR/"data"
 TRAINING_DATA_DIR = DATA_DIR/"training"
+FEATURE_STATE_DIR = DATA_DIR/"feature_state"
+SHARED_FEATURES_DIR = TRAINING_DATA_DIR/"shared"
+EXPERIMENTS_DIR = DATA_DIR/"experiments"
+BENCHMARKS_DIR = DATA_DIR/"benchmarks"
 
 RAW_DATA_DIR = DATA_DIR/"raw"
 DAILY_DATA_DIR = RAW_DATA_DIR/"daily"
+RESPONSE_CACHE_DIR = RAW_DATA_DIR/"responses"
+OHLC_STORE_DIR = RAW_DATA_DIR/"ohlc"
 
+# Synthetic data is kept apart, so that it never mixes with the real data
+SYNTHETIC_DATA_DIR = RAW_DATA_DIR/"synthetic"
+SYNTHETIC_DAILY_DATA_DIR = SYNTHETIC_DATA_DIR/"daily"
+SYNTHETIC_OHLC_STORE_DIR = SYNTHETIC_DATA_DIR/"ohlc"
 
-for folder in [MODELS_DIR, DATA_DIR, RAW_DATA_DIR, DAILY_DATA_DIR, TRAINING_DATA_DIR]:
+
+for folder in [MODELS_DIR, DATA_DIR, RAW_DATA_DIR, DAILY_DATA_DIR, RESPONSE_CACHE_DIR, OHLC_STORE_DIR, SYNTHETIC_DATA_DIR, SYNTHETIC_DAILY_DATA_DIR, SYNTHETIC_OHLC_STORE_DIR, TRAINING_DATA_DIR, SHARED_FEATURES_DIR, FEATURE_STATE_DIR, EXPERIMENTS_DIR, BENCHMARKS_DIR]:
     
     if not Path(folder).exists():
         os.mkdir(folder)
@@ -0,0 +1,428 @@
+import uuid
+import pickle
+import shutil
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+import lightgbm as lgb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pathlib import Path
+from argparse import ArgumentParser
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sklearn.pipeline import Pipeline
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import mean_absolute_error
+
+from src.paths import MODELS_DIR, TRAINING_DATA_DIR
+from src.logger import get_console_logger
+from src.feature_pipeline.data_extraction import update_ohlc
+from src.feature_pipeline.data_transformations import transform_ts_data_into_features_and_target, get_preprocessing_pipeline
+
+
+logger = get_console_logger()
+
+TARGET_COLUMN = "Closing_rate_next_day"
+
+
+def write_feature_dataset(
+    pairs: List[str],
+    path: Path,
+    input_seq_len: int = 30,
+    rows_per_group: int = 50_000,
+    test_fraction: float = 0.1
+) -> Tuple[Path, Path]:
+
+    """
+    Write the windows of closing rates (and their targets) of every pair into a pair of
+    Parquet files (for training and testing), one pair at a time, so that only one pair's
+    data is ever in memory. The pair is taken out of the column names, so that all pairs
+    share the same columns (e.g. "Closing_rate_1_day_ago"), and row groups never mix pairs.
+
+    As in model_training.train, the final test_fraction of each pair's windows is held
+    out for testing.
+
+    Returns:
+        Tuple[Path, Path]: the paths of the training and testing datasets
+    """
+
+    train_path, test_path = path.with_suffix(".train.parquet"), path.with_suffix(".test.parquet")
+    writers = {}
+
+    for pair in pairs:
+
+        logger.info(f"Writing the features of {pair}")
+
+        features, target = transform_ts_data_into_features_and_target(
+            original_data=update_ohlc(base_currency=pair[:3], target_currency=pair[3:]),
+            input_seq_len=input_seq_len,
+            base_currency=pair[:3],
+            target_currency=pair[3:]
+        )
+
+        features.columns = [column.replace(f"_{pair}", "") for column in features.columns]
+        features[TARGET_COLUMN] = target.iloc[:, 0].to_numpy()
+
+        train_sample_size = int((1 - test_fraction)*len(features))
+
+        for split_path, split in [(train_path, features[:train_sample_size]), (test_path, features[train_sample_size:])]:
+
+            table = pa.Table.from_pandas(split, preserve_index=False)
+
+            if split_path not in writers:
+                writers[split_path] = pq.ParquetWriter(split_path, schema=table.schema)
+
+            writers[split_path].write_table(table, row_group_size=rows_per_group)
+
+    for writer in writers.values():
+        writer.close()
+
+    return train_path, test_path
+
+
+class ChunkReader:
+
+    """
+    Reads (and preprocesses) one row group of a feature dataset at a time. Only the last
+    row group that was asked for is kept in memory.
+
+    Indicators are computed separately within each row group, so each one starts with its
+    own warm-up period.
+    """
+
+    def __init__(self, path: Path, preprocessing: Pipeline):
+
+        self.parquet_file = pq.ParquetFile(path)
+        self.preprocessing = preprocessing
+        self.cached_group = None
+        self.cached_chunk = None
+        self.feature_columns = None
+
+    @property
+    def num_row_groups(self) -> int:
+
+        return self.parquet_file.num_row_groups
+
+    def get_num_rows(self, row_group: int) -> int:
+
+        return self.parquet_file.metadata.row_group(row_group).num_rows
+
+    def read(self, row_group: int) -> Tuple[np.ndarray, np.ndarray]:
+
+        """
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: the preprocessed features (converted to an array
+                                           just once, as LightGBM asks for them row by row)
+                                           and the targets of the row group
+        """
+
+        if row_group != self.cached_group:
+
+            chunk = self.parquet_file.read_row_group(row_group).to_pandas()
+            y = chunk.pop(TARGET_COLUMN).to_numpy(dtype=np.float32)
+
+            features = self.preprocessing.fit_transform(chunk)
+
+            self.feature_columns = list(features.columns)
+            self.cached_chunk = features.to_numpy(dtype=np.float64), y
+            self.cached_group = row_group
+
+        return self.cached_chunk
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+
+        for row_group in range(self.num_row_groups):
+            yield self.read(row_group=row_group)
+
+    def get_targets(self) -> np.ndarray:
+
+        return self.parquet_file.read(columns=[TARGET_COLUMN])[TARGET_COLUMN].to_numpy()
+
+
+class RowGroupSequence(lgb.Sequence):
+
+    """ Lets LightGBM build its Dataset from one row group at a time """
+
+    def __init__(self, reader: ChunkReader, row_group: int):
+
+        self.reader = reader
+        self.row_group = row_group
+        self.batch_size = reader.get_num_rows(row_group=row_group)
+
+    def __len__(self) -> int:
+
+        return self.reader.get_num_rows(row_group=self.row_group)
+
+    def __getitem__(self, index: int|slice|List[int]) -> np.ndarray:
+
+        features, _ = self.reader.read(row_group=self.row_group)
+
+        return features[index]
+
+
+class RowGroupIterator(xgb.DataIter):
+
+    """ Feeds XGBoost one row group at a time, so that it can build an external memory DMatrix """
+
+    def __init__(self, reader: ChunkReader, cache_prefix: str):
+
+        self.reader = reader
+        self.row_group = 0
+
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data: Callable) -> int:
+
+        if self.row_group == self.reader.num_row_groups:
+            return 0
+
+        features, y = self.reader.read(row_group=self.row_group)
+        input_data(data=features, label=y)
+
+        self.row_group += 1
+
+        return 1
+
+    def reset(self) -> None:
+
+        self.row_group = 0
+
+
+class ChunkedModel:
+
+    """ A preprocessing pipeline, followed by a model that was trained on chunks of data """
+
+    def __init__(self, preprocessing: Pipeline, model):
+
+        self.preprocessing = preprocessing
+        self.model = model
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+
+        features = self.preprocessing.fit_transform(X).to_numpy()
+
+        if isinstance(self.model, xgb.Booster):
+            return self.model.inplace_predict(features)
+
+        return self.model.predict(features)
+
+
+class RelativeLinearModel:
+
+    """
+    A linear model of the return from yesterday's closing rate to the next one, rather
+    than of the next closing rate itself. The pairs that are pooled together trade at
+    very different levels (from a few units to hundreds), so a model of the levels
+    would be dominated by the dearest pairs. Here, the closing rates and EMAs are taken
+    relative to yesterday's closing rate (the RSI and the percentage changes have no
+    scale to begin with), and the features and returns are standardised.
+    """
+
+    def __init__(self, feature_columns: List[str], alpha: float, eta0: float):
+
+        self.level_indices = [
+            i for i, column in enumerate(feature_columns) if column.startswith("Closing_rate") or column.startswith("EMA_")
+        ]
+
+        self.yesterday_index = feature_columns.index("Closing_rate_1_day_ago")
+
+        self.feature_scaler = StandardScaler()
+        self.target_scaler = StandardScaler()
+        self.model = SGDRegressor(penalty="l1", alpha=alpha, learning_rate="invscaling", eta0=eta0, random_state=0)
+
+    def to_relative(self, features: np.ndarray) -> np.ndarray:
+
+        relative = features.copy()
+        relative[:, self.level_indices] = features[:, self.level_indices]/features[:, [self.yesterday_index]] - 1
+
+        return relative
+
+    def to_returns(self, features: np.ndarray, y: np.ndarray) -> np.ndarray:
+
+        return (y/features[:, self.yesterday_index] - 1).reshape(-1, 1)
+
+    def partial_fit_scalers(self, features: np.ndarray, y: np.ndarray) -> None:
+
+        self.feature_scaler.partial_fit(self.to_relative(features))
+        self.target_scaler.partial_fit(self.to_returns(features, y))
+
+    def partial_fit(self, features: np.ndarray, y: np.ndarray) -> None:
+
+        self.model.partial_fit(
+            self.feature_scaler.transform(self.to_relative(features)),
+            self.target_scaler.transform(self.to_returns(features, y)).ravel()
+        )
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+
+        scaled_returns = self.model.predict(self.feature_scaler.transform(self.to_relative(features)))
+        returns = self.target_scaler.inverse_transform(scaled_returns.reshape(-1, 1)).ravel()
+
+        return features[:, self.yesterday_index]*(1 + returns)
+
+
+def train_lasso_chunked(
+    reader: ChunkReader, 
+    alpha: float = 0.001, 
+    eta0: float = 0.001, 
+    epochs: int = 10, 
+    seed: int = 0
+) -> RelativeLinearModel:
+
+    """
+    Lasso cannot be fitted incrementally, so we use its stochastic counterpart (SGD with
+    an L1 penalty) on returns (see RelativeLinearModel), after standardising the features 
+    and returns with statistics gathered in a first pass over the data. The windows of 
+    each row group are shuffled in every epoch, as they are in time order. 
+
+    The closing rates are highly collinear, and larger learning rates (e.g. an eta0 of 
+    0.01) make SGD diverge. With the defaults, the test error on pooled pairs is within
+    a few percent of that of Lasso fitted to the same features in memory (which 
+    tests/test_chunked_training.py checks).
+    """
+
+    reader.read(row_group=0)
+    model = RelativeLinearModel(feature_columns=reader.feature_columns, alpha=alpha, eta0=eta0)
+
+    for features, y in reader:
+        model.partial_fit_scalers(features=features, y=y)
+
+    rng = np.random.default_rng(seed)
+
+    for epoch in range(epochs):
+
+        logger.info(f"Epoch {epoch + 1} of {epochs}")
+
+        for features, y in reader:
+
+            order = rng.permutation(len(features))
+            model.partial_fit(features=features[order], y=y[order])
+
+    return model
+
+
+def train_lightgbm_chunked(reader: ChunkReader, num_boost_round: int = 200, **params) -> lgb.Booster:
+
+    sequences = [RowGroupSequence(reader=reader, row_group=row_group) for row_group in range(reader.num_row_groups)]
+
+    dataset = lgb.Dataset(data=sequences, label=reader.get_targets(), params={"verbose": -1})
+
+    return lgb.train(params={"objective": "mae", "verbose": -1, **params}, train_set=dataset, num_boost_round=num_boost_round)
+
+
+def train_xgboost_chunked(reader: ChunkReader, num_boost_round: int = 200, **params) -> xgb.Booster:
+
+    """ The pages of the external memory DMatrix are cached in a directory of their own, which is deleted afterwards """
+
+    cache_dir = TRAINING_DATA_DIR/f"xgboost_cache_{uuid.uuid4().hex}"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    dataset = None
+
+    try:
+
+        iterator = RowGroupIterator(reader=reader, cache_prefix=str(cache_dir/"cache"))
+
+        dataset = xgb.DMatrix(iterator)
+
+        return xgb.train(params={"objective": "reg:absoluteerror", **params}, dtrain=dataset, num_boost_round=num_boost_round)
+
+    finally:
+
+        # XGBoost deletes the pages that it knows of once the DMatrix is freed, and we delete the rest
+        del dataset
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def train_chunked(
+    model: str,
+    pairs: List[str],
+    rsi_length: int = 14,
+    ema_length: int = 14,
+    model_hyperparameters: Optional[dict] = None
+) -> Optional[float]:
+
+    """
+    Train a pooled model on the data of many pairs without ever holding more than one row
+    group of features in memory. The features are written to Parquet, and then streamed
+    (one row group at a time) through the preprocessing pipeline into XGBoost's external
+    memory DMatrix, LightGBM's Sequence-based Dataset, or an SGD model of returns with an 
+    L1 penalty (in place of Lasso) that is fitted with partial_fit.
+
+    Returns:
+        Optional[float]: the mean absolute error on the held-out data (None if there is
+                         no held-out data, as with very short histories).
+    """
+
+    model_hyperparameters = model_hyperparameters if model_hyperparameters is not None else {}
+    preprocessing = get_preprocessing_pipeline(rsi_length=rsi_length, ema_length=ema_length)
+
+    train_path, test_path = write_feature_dataset(pairs=pairs, path=TRAINING_DATA_DIR/"pooled_features")
+
+    train_reader = ChunkReader(path=train_path, preprocessing=preprocessing)
+
+    logger.info(f"Training a chunked {model} model on {len(pairs)} pairs")
+
+    if model.lower() == "lasso":
+        trained_model = train_lasso_chunked(reader=train_reader, **model_hyperparameters)
+
+    elif model == "lightgbm":
+        trained_model = train_lightgbm_chunked(reader=train_reader, **model_hyperparameters)
+
+    elif model == "xgboost":
+        trained_model = train_xgboost_chunked(reader=train_reader, **model_hyperparameters)
+
+    else:
+        raise NotImplementedError("The model that you have requested has not been implemented.")
+
+    chunked_model = ChunkedModel(preprocessing=preprocessing, model=trained_model)
+
+    # Evaluate one row group at a time as well
+    test_file = pq.ParquetFile(test_path)
+    errors, rows = 0.0, 0
+
+    for row_group in range(test_file.num_row_groups):
+
+        chunk = test_file.read_row_group(row_group).to_pandas()
+        y_test = chunk.pop(TARGET_COLUMN)
+
+        errors += mean_absolute_error(y_test, chunked_model.predict(chunk))*len(chunk)
+        rows += len(chunk)
+
+    if rows == 0:
+
+        logger.warning("There is no held-out data to evaluate the model on")
+        test_error = None
+
+    else:
+
+        test_error = errors/rows
+        logger.info(f"Test M.A.E: {test_error}")
+
+    with open(MODELS_DIR/f"Chunked {model} model.pkl", "wb") as f:
+
+        pickle.dump(chunked_model, f)
+
+    return test_error
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser()
+
+    parser.add_argument("--model", type=str, default="lasso")
+    parser.add_argument("--pairs", type=str, nargs="+", default=["GBPGHS"])
+    parser.add_argument("--rsi_length", type=int, default=14)
+    parser.add_argument("--ema_length", type=int, default=14)
+
+    args = parser.parse_args()
+
+    train_chunked(
+        model=args.model,
+        pairs=args.pairs,
+        rsi_length=args.rsi_length,
+        ema_length=args.ema_length
+    )
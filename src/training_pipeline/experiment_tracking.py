@@ -0,0 +1,286 @@
+import json
+import time
+import uuid
+import queue
+import shutil
+import weakref
+import threading
+
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from src.config import settings
+from src.paths import EXPERIMENTS_DIR
+from src.logger import get_console_logger
+
+
+logger = get_console_logger()
+
+# Tells the tracker's thread to flush what it has, and stop
+STOP = object()
+
+
+class TrackingBackend:
+
+    """ Where a tracker's tags, metrics and models end up """
+
+    def write(self, events: List[dict]) -> None:
+
+        raise NotImplementedError
+
+    def upload_model(self, name: str, path: str) -> None:
+
+        raise NotImplementedError
+
+    def close(self) -> None:
+
+        pass
+
+
+class CometBackend(TrackingBackend):
+
+    """
+    Sends everything to a CometML experiment. The experiment is only created once the
+    first batch is written (on the tracker's thread), as creating it involves a round
+    trip to Comet's servers. Models may be uploaded from other threads, so the creation
+    is guarded by a lock, to make sure that only one experiment is ever created.
+    """
+
+    def __init__(self):
+
+        self.experiment = None
+        self.lock = threading.Lock()
+
+    def get_experiment(self):
+
+        if self.experiment is None:
+
+            with self.lock:
+
+                if self.experiment is None:
+
+                    from comet_ml import Experiment
+
+                    self.experiment = Experiment(
+                        api_key=settings.comet_api_key,
+                        workspace=settings.comet_workspace,
+                        project_name=settings.comet_project_name
+                    )
+
+        return self.experiment
+
+    def write(self, events: List[dict]) -> None:
+
+        experiment = self.get_experiment()
+        metrics_by_step = defaultdict(dict)
+
+        for event in events:
+
+            if event["type"] == "tag":
+                experiment.add_tag(event["tag"])
+
+            elif event["type"] == "metric":
+                metrics_by_step[event["step"]][event["name"]] = event["value"]
+
+        for step, metrics in metrics_by_step.items():
+            experiment.log_metrics(metrics, step=step)
+
+    def upload_model(self, name: str, path: str) -> None:
+
+        self.get_experiment().log_model(name, path)
+
+    def close(self) -> None:
+
+        if self.experiment is not None:
+            self.experiment.end()
+
+
+class LocalFileBackend(TrackingBackend):
+
+    """
+    Appends every event, as a line of JSON, to a file of its own for each run, and
+    copies the models into a folder beside it. Nothing leaves the machine.
+    """
+
+    def __init__(self, directory: Path = EXPERIMENTS_DIR, run_id: Optional[str] = None):
+
+        self.run_id = run_id if run_id is not None else f"{datetime.today():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.path = Path(directory)/f"{self.run_id}.jsonl"
+        self.models_dir = Path(directory)/self.run_id
+
+    def write(self, events: List[dict]) -> None:
+
+        with open(self.path, "a") as file:
+            file.writelines(json.dumps(event) + "\n" for event in events)
+
+    def upload_model(self, name: str, path: str) -> None:
+
+        self.models_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copy(path, self.models_dir/Path(path).name)
+
+
+def get_tracking_backend(backend: str = settings.tracking_backend) -> TrackingBackend:
+
+    if backend == "comet":
+        return CometBackend()
+
+    elif backend == "local":
+        return LocalFileBackend()
+
+    else:
+        raise NotImplementedError(f"The {backend} tracking backend has not been implemented")
+
+
+def flush_events(backend: TrackingBackend, batch: List[dict]) -> None:
+
+    try:
+        backend.write(events=batch)
+
+    except Exception:
+        logger.exception(f"Failed to write {len(batch)} event(s) to the experiment tracker")
+
+
+def write_events(events: queue.Queue, backend: TrackingBackend, batch_size: int, flush_interval: float) -> None:
+
+    """ Write the events on the queue to the backend in batches, until we are told to stop """
+
+    batch = []
+    last_flush = time.monotonic()
+
+    while True:
+
+        try:
+            event = events.get(timeout=flush_interval)
+
+        except queue.Empty:
+            event = None
+
+        if event is not None and event is not STOP:
+            batch.append(event)
+
+        is_due = len(batch) >= batch_size or time.monotonic() - last_flush >= flush_interval
+
+        if batch and (is_due or event is STOP):
+
+            flush_events(backend=backend, batch=batch)
+
+            batch = []
+            last_flush = time.monotonic()
+
+        if event is STOP:
+            break
+
+
+def upload_model(events: queue.Queue, backend: TrackingBackend, name: str, path: str) -> None:
+
+    try:
+        backend.upload_model(name=name, path=path)
+
+    except Exception:
+
+        logger.exception(f"Failed to upload the model {name} to the experiment tracker")
+        return
+
+    # Record the upload alongside the metrics (only the local backend keeps such events)
+    events.put({"type": "model", "name": name, "path": path, "time": time.time()})
+
+
+def close_tracker(
+    events: queue.Queue,
+    writer: threading.Thread,
+    uploads: ThreadPoolExecutor,
+    backend: TrackingBackend
+) -> None:
+
+    """ Flush all the events, wait for the uploads to finish, and close the backend """
+
+    # The uploads finish first, as they add events of their own
+    uploads.shutdown(wait=True)
+    events.put(STOP)
+    writer.join()
+
+    try:
+        backend.close()
+
+    except Exception:
+        logger.exception("Failed to close the experiment tracker")
+
+
+class Tracker:
+
+    """
+    A drop-in replacement for the parts of comet_ml's Experiment that training uses,
+    which never makes training wait. Tags and metrics are put on a queue, and a
+    background thread writes them to the backend in batches (of up to batch_size events,
+    or whatever has arrived within flush_interval seconds). Models are uploaded on a
+    thread of their own, so that a large upload doesn't hold up the metrics.
+
+    Any error in the backend is logged rather than raised, so a tracker that is slow or
+    unreachable cannot stop a training run. Call end to flush whatever is left (in the
+    background, if need be). A tracker that was never ended is closed when it is garbage
+    collected, or when the interpreter exits. Neither of its threads refers back to it,
+    so a tracker that is no longer used can always be collected.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[TrackingBackend] = None,
+        batch_size: int = settings.tracking_batch_size,
+        flush_interval: float = settings.tracking_flush_interval
+    ):
+
+        self.backend = backend if backend is not None else get_tracking_backend()
+
+        self.events = queue.Queue()
+        self.uploads = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tracker-uploads")
+
+        self.thread = threading.Thread(
+            target=write_events,
+            kwargs={"events": self.events, "backend": self.backend, "batch_size": batch_size, "flush_interval": flush_interval},
+            name="tracker",
+            daemon=True
+        )
+
+        self.thread.start()
+
+        # Runs once: on end, on garbage collection, or at exit (whichever comes first)
+        self.close = weakref.finalize(self, close_tracker, self.events, self.thread, self.uploads, self.backend)
+
+    def add_tag(self, tag: str) -> None:
+
+        self.events.put({"type": "tag", "tag": tag, "time": time.time()})
+
+    def log_metric(self, name: str, value: float, step: Optional[int] = None) -> None:
+
+        self.events.put({"type": "metric", "name": name, "value": float(value), "step": step, "time": time.time()})
+
+    def log_metrics(self, metrics: Dict[str, float], step: Optional[int] = None) -> None:
+
+        for name, value in metrics.items():
+            self.log_metric(name=name, value=value, step=step)
+
+    def log_model(self, name: str, path: str) -> None:
+
+        self.uploads.submit(upload_model, self.events, self.backend, name, path)
+
+    def end(self, wait: bool = True) -> None:
+
+        """
+        Flush all the events, wait for the uploads to finish, and close the backend.
+
+        Args:
+            wait: whether to wait for all that. If not, it is done on a thread of its own, 
+                  which the interpreter waits for before it exits.
+        """
+
+        if not self.close.alive:
+            return
+
+        if wait:
+            self.close()
+
+        else:
+            threading.Thread(target=self.close, name="tracker-close").start()
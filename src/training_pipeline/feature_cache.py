@@ -0,0 +1,79 @@
+import threading
+import pandas as pd
+
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from src.config import settings
+from src.logger import get_console_logger
+
+
+logger = get_console_logger()
+
+
+class FeatureCache:
+
+    """
+    An in-process, least-recently-used cache of transformed feature matrices.
+
+    During tuning, many trials share the same preprocessing hyperparameters, and every
+    trial transforms the same cross-validation folds. Keying the transformed folds by
+    the preprocessing hyperparameters and the fold's row range lets later trials reuse
+    them, and spend their time on fitting models instead. Once the cached matrices take
+    up more than max_bytes, the least recently used ones are dropped.
+    """
+
+    def __init__(self, max_bytes: int = settings.feature_cache_max_bytes):
+
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+
+        """
+        Args:
+            key: the preprocessing hyperparameters and row range of the fold.
+            compute: makes the transformed features if they are not in the cache.
+
+        Returns:
+            pd.DataFrame: the transformed features
+        """
+
+        with self.lock:
+
+            if key in self.entries:
+
+                self.hits += 1
+                self.entries.move_to_end(key)
+
+                return self.entries[key]
+
+            self.misses += 1
+
+        features = compute()
+        size = int(features.memory_usage(index=True).sum())
+
+        with self.lock:
+
+            if key not in self.entries and size <= self.max_bytes:
+
+                self.entries[key] = features
+                self.size += size
+
+                while self.size > self.max_bytes:
+
+                    _, evicted = self.entries.popitem(last=False)
+                    self.size -= int(evicted.memory_usage(index=True).sum())
+
+        return features
+
+    def log_stats(self) -> None:
+
+        logger.info(
+            f"Feature cache: {self.hits} hits, {self.misses} misses, {len(self.entries)} entries "
+            f"({self.size/1024**2:.1f}MB)"
+        )
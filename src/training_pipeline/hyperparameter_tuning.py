@@ -1,25 +1,50 @@
+import os
+import math
 import optuna
 import numpy as np 
 import pandas as pd
 
+from pathlib import Path
+from datetime import datetime
+from argparse import ArgumentParser
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from optuna.storages import JournalStorage, JournalFileOpenLock
+
+try:
+    from optuna.storages.journal import JournalFileBackend
+
+except ImportError:
+    # Optuna 3 (which we pin) calls the journal file backend JournalFileStorage
+    from optuna.storages import JournalFileStorage as JournalFileBackend
+
 from xgboost import XGBRegressor
 from lightgbm import LGBMRegressor 
 
-from comet_ml import Experiment
 
 from sklearn.linear_model import Lasso
-from sklearn.pipeline import make_pipeline
 from sklearn.metrics import mean_absolute_error
 from sklearn.model_selection import TimeSeriesSplit
 
-from typing import Callable, Tuple, Dict
+from typing import Callable, Tuple, Dict, Optional
 
+from src.config import settings
+from src.paths import TRAINING_DATA_DIR
 from src.logger import get_console_logger
 from src.feature_pipeline.data_transformations import get_preprocessing_pipeline
+from src.training_pipeline.feature_cache import FeatureCache
+from src.training_pipeline.shared_features import SharedFeatures
+from src.training_pipeline.experiment_tracking import Tracker
 
 
 logger = get_console_logger()
 
+NUMBER_OF_FOLDS = 5
+
+# When trials can be pruned, only this many folds are fitted at a time (by default), so 
+# that a pruned trial still skips the folds that have not been started
+FOLDS_IN_FLIGHT_WHEN_PRUNING = 2
+
 def sample_hyperparameters(
     model_fn: Callable,
     trial: optuna.trial.Trial
@@ -70,28 +95,105 @@ def sample_hyperparameters(
         raise NotImplementedError("This model is yet to be implemented")
     
     
-def optimise_hyperparameters(
-    model_fn: Callable,
-    tuning_trials: int, 
-    X: pd.DataFrame,
-    y: pd.Series, 
-    experiment: Experiment
-) -> Tuple[Dict, Dict]:
+def get_thread_budget(tuning_workers: int = 1, thread_budget: Optional[int] = None) -> int:
     
     """
-    We will be optimising two sets of hyperparameters: those that form part of
-    our preprocessing operations, and those that control model performance.
+    Args:
+        tuning_workers: the number of tuning workers (processes).
+        thread_budget: the threads that the whole search may use (e.g. an orchestrated 
+                       job's share of the machine). By default, each worker gets 
+                       settings.tuning_thread_budget threads, or else its share of the cores.
 
-    The optimal hyperparameters will be found by minimising the error function
-    defined below.
+    Returns:
+        int: the number of threads that each tuning worker (process) may use, so that
+             together they use each core once.
+    """
+    
+    if thread_budget is not None:
+        return max(1, thread_budget//max(tuning_workers, 1))
+    
+    if settings.tuning_thread_budget is not None:
+        return settings.tuning_thread_budget
+    
+    return max(1, (os.cpu_count() or 1)//max(tuning_workers, 1))
+
+
+def split_thread_budget(model_fn: Callable, thread_budget: int, prune: bool = False) -> Tuple[int, Optional[int]]:
+    
+    """
+    Share a worker's threads between the folds (fitted concurrently) and the model's
+    own threads, so that the machine is kept busy without being oversubscribed. Lasso
+    is single-threaded, so it gets one fold per thread. LightGBM and XGBoost get the 
+    threads that are left over once the folds have been given one each.
+    
+    If every fold were in flight at once, a pruned trial would have nothing left to skip,
+    so when trials can be pruned we only fit FOLDS_IN_FLIGHT_WHEN_PRUNING folds at a 
+    time, and give the boosters the rest of the threads. For Lasso, this leaves threads
+    idle: a trade-off between the time of a full trial and the time saved by pruning.
+
+    Args:
+        model_fn: the model being tuned
+        thread_budget: the number of threads that the worker may use
+        prune: whether the study's pruner may stop trials early
 
     Returns:
-        Tuple[Dict, Dict]: a tuple of dictionaries, where the first dictionary
-        consists of the best values of the preprocessing hyperparameter, and 
-        the second consists of the best values of the model's hyperparameter
+        Tuple[int, Optional[int]]: the number of folds to fit at a time, and the number
+                                   of threads for each model (None for Lasso).
     """
     
-    assert model_fn in [Lasso, LGBMRegressor, XGBRegressor]
+    default_fold_workers = FOLDS_IN_FLIGHT_WHEN_PRUNING if prune else NUMBER_OF_FOLDS
+    
+    fold_workers = settings.tuning_fold_workers or min(default_fold_workers, thread_budget)
+    fold_workers = max(1, min(fold_workers, thread_budget, NUMBER_OF_FOLDS))
+    
+    if model_fn == Lasso:
+        return fold_workers, None
+    
+    return fold_workers, max(1, thread_budget//fold_workers)
+
+
+def make_objective(
+    model_fn: Callable, 
+    shared_features: SharedFeatures, 
+    feature_cache: FeatureCache,
+    thread_budget: int = 1,
+    prune: bool = False
+) -> Callable[[optuna.trial.Trial], float]:
+    
+    """
+    Make the error function that the tuning trials minimise. It is made by a function
+    of its own (rather than inside optimise_hyperparameters), so that every tuning 
+    worker can make its own copy from the shared features.
+    
+    The folds of a trial are fitted and scored concurrently, in a pool of threads 
+    (the models and most of the preprocessing release the GIL, and the threads share
+    the feature cache and the memory-mapped features). Their errors are still reported
+    to the pruner in the order of the folds.
+    """
+    
+    fold_workers, model_threads = split_thread_budget(model_fn=model_fn, thread_budget=thread_budget, prune=prune)
+    
+    logger.info(f"Fitting {fold_workers} fold(s) at a time, with {model_threads or 1} thread(s) per model")
+    
+    def transform_fold(
+        X_fold: pd.DataFrame, 
+        start: int,
+        stop: int,
+        hyperparameters_for_preprocessing: dict
+    ) -> pd.DataFrame:
+        
+        """
+        The preprocessing steps learn nothing during fitting, so the features of a fold
+        only depend on the preprocessing hyperparameters and the fold's rows. We can
+        therefore reuse the features of any earlier trial that used the same values.
+        """
+        
+        key = (tuple(sorted(hyperparameters_for_preprocessing.items())), start, stop)
+        
+        return feature_cache.get_or_compute(
+            key=key,
+            compute=lambda: get_preprocessing_pipeline(**hyperparameters_for_preprocessing).fit_transform(X_fold)
+        )
     
     def objective(trial: optuna.trial.Trial) -> float:
         
@@ -110,46 +212,339 @@ def optimise_hyperparameters(
         # Initiate the appropriate model hyperparameters
         model_hyperparameters = sample_hyperparameters(model_fn=model_fn, trial=trial)
         
+        if model_threads is not None:
+            model_hyperparameters = {**model_hyperparameters, "n_jobs": model_threads}
+        
         # Set up a time series split with 5 splits
-        tss = TimeSeriesSplit(n_splits=5)
+        tss = TimeSeriesSplit(n_splits=NUMBER_OF_FOLDS)
+        splits = list(tss.split(np.arange(len(shared_features))))
         scores = []
         
         logger.info(f"{trial.number=}")
         
         # Split the data, implement preprocessing, and instatiate the model using
         # the values of the shyperparameters selected by each trial.
-        for split_number, (train_index, val_index) in enumerate(tss.split(X)):
+        def fit_and_score_fold(split_number: int, train_index: np.ndarray, val_index: np.ndarray) -> float:
             
-            # Establish the training and test datasets
-            X_train, X_val = X.iloc[train_index], X.iloc[val_index]
-            y_train, y_val = y.iloc[train_index], y.iloc[val_index]
+            # The folds are consecutive rows, so we take them as views of the shared features
+            train_start, train_stop = train_index[0], train_index[-1] + 1
+            val_start, val_stop = val_index[0], val_index[-1] + 1
             
-            logger.info(f"{split_number=}")
-            logger.info(f"{len(X_train)=}")
-            logger.info(f"{len(X_val)=}")
+            X_train, y_train = shared_features.get_fold(start=train_start, stop=train_stop)
+            X_val, y_val = shared_features.get_fold(start=val_start, stop=val_stop)
             
-            pipeline = make_pipeline(
-                get_preprocessing_pipeline(**hyperparameters_for_preprocessing),
-                model_fn(**model_hyperparameters)
-            )
+            logger.info(f"{split_number=}, {len(X_train)=}, {len(X_val)=}")
+            
+            X_train_transformed = transform_fold(X_train, train_start, train_stop, hyperparameters_for_preprocessing)
+            X_val_transformed = transform_fold(X_val, val_start, val_stop, hyperparameters_for_preprocessing)
             
-            pipeline.fit(X_train, y_train)
+            model = model_fn(**model_hyperparameters)
+            model.fit(X_train_transformed, y_train)
             
-            y_pred = pipeline.predict(X_val)
+            y_pred = model.predict(X_val_transformed)
             mae = mean_absolute_error(y_val, y_pred)
-            scores.append(mae)
             
-            logger.info(f"{mae=}")
+            logger.info(f"{split_number=}, {mae=}")
+            
+            return mae
+        
+        with ThreadPoolExecutor(max_workers=fold_workers) as executor:
+            
+            # Only fold_workers folds are in flight at a time, so that pruning a trial saves the work of later folds
+            futures = [
+                executor.submit(fit_and_score_fold, split_number, *splits[split_number]) 
+                for split_number in range(min(fold_workers, len(splits)))
+            ]
+            
+            for split_number in range(len(splits)):
+                
+                scores.append(futures[split_number].result())
+                
+                # Give up on the trial if it is already clearly worse than the others were by this fold
+                trial.report(np.mean(scores), step=split_number)
+                
+                if trial.should_prune():
+                    
+                    for future in futures:
+                        future.cancel()
+                    
+                    logger.info(f"Pruning trial {trial.number} after {split_number + 1} fold(s)")
+                    raise optuna.TrialPruned()
+                
+                next_split = split_number + fold_workers
+                
+                if next_split < len(splits):
+                    futures.append(executor.submit(fit_and_score_fold, next_split, *splits[next_split]))
         
         # Compute the average of the accuracy scores
         average_score = np.array(scores).mean()
         
         return average_score 
     
-    logger.info("Searching for optimal values of the hyperparameters")
+    return objective
+
+
+def get_pruner(pruner: str = settings.tuning_pruner) -> optuna.pruners.BasePruner:
+    
+    """
+    Every trial reports its running average error after each cross-validation fold,
+    and the pruner decides (by comparing it with the same fold of earlier trials) 
+    whether the trial is hopeless, and should be stopped. The folds are the resource 
+    that successive halving and Hyperband ration.
+
+    Raises:
+        NotImplementedError: if the pruner has not been implemented.
+    """
+    
+    if pruner == "median":
+        
+        return optuna.pruners.MedianPruner(
+            n_startup_trials=settings.tuning_pruner_startup_trials, 
+            n_warmup_steps=settings.tuning_pruner_warmup_folds
+        )
+        
+    elif pruner == "percentile":
+        
+        return optuna.pruners.PercentilePruner(
+            percentile=settings.tuning_pruner_percentile,
+            n_startup_trials=settings.tuning_pruner_startup_trials, 
+            n_warmup_steps=settings.tuning_pruner_warmup_folds
+        )
+        
+    elif pruner == "successive_halving":
+        return optuna.pruners.SuccessiveHalvingPruner(min_resource=1)
+    
+    elif pruner == "hyperband":
+        return optuna.pruners.HyperbandPruner(min_resource=1, max_resource=NUMBER_OF_FOLDS)
+    
+    elif pruner == "none":
+        return optuna.pruners.NopPruner()
     
-    study = optuna.create_study(direction = "minimize")
-    study.optimize(objective, n_trials = tuning_trials)
+    else:
+        raise NotImplementedError(f"The {pruner} pruner has not been implemented")
+
+
+def get_storage(storage: Optional[str]) -> Optional[str|JournalStorage]:
+    
+    """
+    Args:
+        storage: a database URL (e.g. "sqlite:///optuna.db"), the path of a journal file,
+                 or None (in which case the study is kept in memory).
+
+    Returns:
+        Optional[str|JournalStorage]: the storage, in a form that optuna accepts.
+    """
+    
+    if storage is None or "://" in storage:
+        return storage
+    
+    # The lock works on network file systems too, so that machines can share the journal
+    return JournalStorage(JournalFileBackend(storage, lock_obj=JournalFileOpenLock(storage)))
+
+
+def get_study_name(model_fn: Callable, pair: Optional[str] = None, date: Optional[str] = None) -> str:
+    
+    """
+    Studies are named after the model, the pair and the day, so that workers on other
+    machines can work out the name of a running study (see the bottom of this module).
+    
+    Args:
+        pair: the currency pair, or None for the default one (GBPGHS).
+        date: the day of the study (as "%Y-%m-%d"), or None for today.
+    """
+    
+    date = date if date is not None else datetime.today().strftime("%Y-%m-%d")
+    
+    return f"{model_fn.__name__}-{pair if pair is not None else 'GBPGHS'}-{date}"
+
+
+def get_default_journal_path(study_name: str) -> Path:
+    
+    """ Without a storage, each study is kept in a journal of its own, which is deleted once the study is over """
+    
+    return TRAINING_DATA_DIR/"optuna"/f"{study_name}.log"
+
+
+def run_tuning_worker(
+    study_name: str,
+    storage: str,
+    model_fn: Callable,
+    shared_features: SharedFeatures,
+    trials_per_worker: int,
+    tuning_trials: int,
+    pruner: str = settings.tuning_pruner,
+    thread_budget: int = 1
+) -> int:
+    
+    """
+    Run trials of a study that is kept in shared storage, until either this worker has
+    run trials_per_worker of them, or the study as a whole has tuning_trials of them.
+    Workers may run in processes on this machine, or on other machines (see the bottom
+    of this module), as long as they can all reach the storage and the shared features.
+
+    Returns:
+        int: the number of trials that the worker ran.
+    """
+    
+    study = optuna.load_study(study_name=study_name, storage=get_storage(storage), pruner=get_pruner(pruner))
+    feature_cache = FeatureCache()
+    
+    objective = make_objective(
+        model_fn=model_fn, 
+        shared_features=shared_features, 
+        feature_cache=feature_cache,
+        thread_budget=thread_budget,
+        prune=pruner != "none"
+    )
+    
+    trials_run = []
+    
+    study.optimize(
+        objective, 
+        n_trials=trials_per_worker, 
+        callbacks=[
+            optuna.study.MaxTrialsCallback(n_trials=tuning_trials, states=None),
+            lambda study, trial: trials_run.append(trial.number)
+        ]
+    )
+    
+    feature_cache.log_stats()
+    
+    return len(trials_run)
+
+
+def optimise_hyperparameters(
+    model_fn: Callable,
+    tuning_trials: int, 
+    X: pd.DataFrame,
+    y: pd.Series, 
+    experiment: Tracker,
+    shared_features: Optional[SharedFeatures] = None,
+    tuning_workers: int = settings.tuning_workers,
+    storage: Optional[str] = settings.tuning_storage,
+    study_name: Optional[str] = None,
+    pruner: str = settings.tuning_pruner,
+    pair: Optional[str] = None,
+    thread_budget: Optional[int] = None
+) -> Tuple[Dict, Dict]:
+    
+    """
+    We will be optimising two sets of hyperparameters: those that form part of
+    our preprocessing operations, and those that control model performance.
+
+    The optimal hyperparameters will be found by minimising the error function
+    defined in make_objective.
+    
+    The folds are read from memory-mapped copies of X and y (see SharedFeatures). If 
+    the caller has not written them already, we write them here, and delete them once
+    the search is over.
+    
+    With more than one tuning worker (or a storage), the trials are shared out among
+    worker processes that coordinate through the storage (by default, a journal file of
+    the study's own, which is deleted once the search is over). Workers on other machines
+    can join the study by its name (see get_study_name) while it is running. A study 
+    that is already in the storage under the same name is resumed.
+    
+    If a pruner has been chosen (see get_pruner), trials that are clearly worse than 
+    earlier ones after a fold or two are pruned, so that more of the trials can be spent
+    on promising values.
+    
+    The threads of the search (thread_budget, if given) are shared out between the 
+    workers (see get_thread_budget).
+
+    Returns:
+        Tuple[Dict, Dict]: a tuple of dictionaries, where the first dictionary
+        consists of the best values of the preprocessing hyperparameter, and 
+        the second consists of the best values of the model's hyperparameter
+    """
+    
+    assert model_fn in [Lasso, LGBMRegressor, XGBRegressor]
+    
+    owns_shared_features = shared_features is None
+    default_journal_path = None
+    
+    if owns_shared_features:
+        shared_features = SharedFeatures.write(X=X, y=y)
+    
+    try:
+        
+        logger.info("Searching for optimal values of the hyperparameters")
+        
+        if tuning_workers <= 1 and storage is None:
+            
+            feature_cache = FeatureCache()
+            
+            study = optuna.create_study(direction = "minimize", pruner=get_pruner(pruner))
+            study.optimize(
+                make_objective(
+                    model_fn=model_fn, 
+                    shared_features=shared_features, 
+                    feature_cache=feature_cache, 
+                    thread_budget=get_thread_budget(tuning_workers=1, thread_budget=thread_budget),
+                    prune=pruner != "none"
+                ), 
+                n_trials = tuning_trials
+            )
+            
+            feature_cache.log_stats()
+        
+        else:
+            
+            study_name = study_name if study_name is not None else get_study_name(model_fn=model_fn, pair=pair)
+            default_journal_path = get_default_journal_path(study_name=study_name) if storage is None else None
+            
+            if default_journal_path is not None:
+                
+                default_journal_path.parent.mkdir(parents=True, exist_ok=True)
+                storage = str(default_journal_path)
+            
+            study = optuna.create_study(
+                study_name=study_name, 
+                storage=get_storage(storage), 
+                direction="minimize", 
+                pruner=get_pruner(pruner),
+                load_if_exists=True
+            )
+            
+            trials_per_worker = settings.tuning_trials_per_worker or math.ceil(tuning_trials/max(tuning_workers, 1))
+            
+            logger.info(
+                f"Running study {study_name} with {tuning_workers} worker(s) of up to {trials_per_worker} trials each"
+                f" (storage: {storage}, shared features: {shared_features.directory})"
+            )
+            
+            worker_kwargs = {
+                "study_name": study_name, 
+                "storage": storage, 
+                "model_fn": model_fn, 
+                "shared_features": shared_features,
+                "trials_per_worker": trials_per_worker,
+                "tuning_trials": tuning_trials,
+                "pruner": pruner,
+                "thread_budget": get_thread_budget(tuning_workers=tuning_workers, thread_budget=thread_budget)
+            }
+            
+            if tuning_workers <= 1:
+                run_tuning_worker(**worker_kwargs)
+            
+            else:
+                
+                # Forking a process that has already started threads (e.g. CometML's) is unsafe
+                with ProcessPoolExecutor(max_workers=tuning_workers, mp_context=get_context("spawn")) as executor:
+                    
+                    futures = [executor.submit(run_tuning_worker, **worker_kwargs) for _ in range(tuning_workers)]
+                    trials_run = [future.result() for future in futures]
+                
+                logger.info(f"Trials run by each worker: {trials_run}")
+    
+    # The memory-mapped files are deleted even if a worker fails
+    finally:
+        
+        if owns_shared_features:
+            shared_features.remove()
+    
+    pruned_trials = study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.PRUNED,))
+    logger.info(f"{len(pruned_trials)} of {len(study.trials)} trials were pruned")
     
     best_params = study.best_params
     best_value = study.best_value
@@ -172,4 +567,53 @@ def optimise_hyperparameters(
     
     experiment.log_metric(name="Cross validation MAE", value=best_value)
     
+    if default_journal_path is not None:
+        default_journal_path.unlink(missing_ok=True)
+    
     return best_preprocessing_hyperparams, best_model_hyperparams
+
+
+if __name__ == "__main__":
+    
+    # Join a running study from another machine. The storage and the shared features 
+    # must be on a disk that both machines can reach. Unless they are given, the name of
+    # the study and its storage are worked out from the model, the pair and the date, as
+    # optimise_hyperparameters does.
+    from src.training_pipeline.model_training import get_model
+    
+    parser = ArgumentParser()
+    
+    parser.add_argument("--model", type=str, default="lasso")
+    parser.add_argument("--pair", type=str, default=None)
+    parser.add_argument("--date", type=str, default=None)
+    parser.add_argument("--study_name", type=str, default=None)
+    parser.add_argument("--storage", type=str, default=settings.tuning_storage)
+    parser.add_argument("--shared_features", type=str, required=True)
+    parser.add_argument("--trials_per_worker", type=int, default=10)
+    parser.add_argument("--tuning_trials", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--pruner", type=str, default=settings.tuning_pruner)
+    
+    args = parser.parse_args()
+    
+    model_fn = get_model(args.model)
+    study_name = args.study_name or get_study_name(model_fn=model_fn, pair=args.pair, date=args.date)
+    
+    logger.info(f"Joining study {study_name}")
+    
+    worker_kwargs = {
+        "study_name": study_name, 
+        "storage": args.storage or str(get_default_journal_path(study_name=study_name)), 
+        "model_fn": model_fn, 
+        "shared_features": SharedFeatures(directory=args.shared_features),
+        "trials_per_worker": args.trials_per_worker,
+        "tuning_trials": args.tuning_trials,
+        "pruner": args.pruner,
+        "thread_budget": get_thread_budget(tuning_workers=args.workers)
+    }
+    
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context("spawn")) as executor:
+        
+        futures = [executor.submit(run_tuning_worker, **worker_kwargs) for _ in range(args.workers)]
+        
+        logger.info(f"Trials run by each worker: {[future.result() for future in futures]}")
@@ -0,0 +1,194 @@
+import pickle
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+from argparse import ArgumentParser
+from typing import Optional
+
+from xgboost import XGBRegressor
+from lightgbm import LGBMRegressor
+
+from sklearn.linear_model import Lasso
+from sklearn.metrics import mean_absolute_error
+
+from src.config import settings
+from src.paths import MODELS_DIR
+from src.logger import get_console_logger
+from src.training_pipeline.model_training import train, get_tuned_model_name, load_training_metadata, save_training_metadata, export_compiled_model
+from src.feature_pipeline.data_transformations import transform_ts_data_into_features_and_target, get_target_dates
+from src.feature_pipeline.data_extraction import update_ohlc
+
+
+logger = get_console_logger()
+
+
+def needs_full_retrain(metadata: dict, new_error: float) -> bool:
+
+    """
+    A full retrain (with a new hyperparameter search) is due when the last one is
+    older than full_retrain_every_days, or when the model's error on the windows that
+    it has not seen yet has drifted beyond drift_tolerance times its last test error.
+    """
+
+    days_since_full_retrain = (datetime.today() - datetime.strptime(metadata["full_retrain_date"], "%Y-%m-%d")).days
+
+    if days_since_full_retrain >= settings.full_retrain_every_days:
+
+        logger.info(f"The last full retrain was {days_since_full_retrain} days ago")
+        return True
+
+    if new_error > settings.drift_tolerance*metadata["test_error"]:
+
+        logger.info(f"The error on the new data ({new_error}) has drifted from the test error ({metadata['test_error']})")
+        return True
+
+    return False
+
+
+def retrain_incrementally(
+    X: pd.DataFrame,
+    y: pd.Series,
+    dates: pd.Series,
+    model: str,
+    tuning_trials: Optional[int] = 10,
+    pair: Optional[str] = None
+) -> None:
+
+    """
+    Bring the saved tuned model up to date with the windows that have been added since
+    it was last trained, rather than tuning and fitting it from scratch. The new windows
+    are those whose targets come after the last date that the model was trained on (see
+    get_target_dates), as filling gaps in the history inserts rows into its middle, which
+    shifts the positions of the windows.
+
+    - LightGBM and XGBoost append incremental_trees trees to their boosters. With only
+      a handful of new windows, no tree could be grown on them alone, so the trees are
+      fitted on the last incremental_window_rows windows (which include all the new ones).
+
+    - Lasso can't be fitted to new windows alone, so it is refitted on all the windows
+      (not just the new ones), starting (with warm_start) from its current coefficients,
+      so that coordinate descent converges in a few passes. Each update still costs a
+      pass over the whole history.
+
+    The preprocessing learns nothing from the data, so it is left as it is. If there is
+    no saved model yet, or a full retrain is due (see needs_full_retrain), we fall back
+    to train.
+    """
+
+    metadata = load_training_metadata(model=model, pair=pair)
+    model_path = MODELS_DIR/f"{get_tuned_model_name(model=model, pair=pair)}.pkl"
+
+    if metadata is None or not model_path.exists():
+
+        logger.info("There is no saved model to update, so we will train one from scratch")
+        train(X=X, y=y, model=model, tune_hyperparameters=True, tuning_trials=tuning_trials, pair=pair, dates=dates)
+
+        return
+
+    if metadata.get("last_trained_date") is not None:
+        first_new_row = int(np.searchsorted(dates.to_numpy(), metadata["last_trained_date"], side="right"))
+
+    # Models saved before the dates were recorded only know how many rows they were trained on
+    else:
+
+        logger.warning("The model has no record of the last date it was trained on, so we go by its number of rows")
+        first_new_row = metadata["trained_rows"]
+
+    if len(X) <= first_new_row:
+
+        logger.info("There are no new windows to train on")
+        return
+
+    with open(model_path, "rb") as f:
+
+        pipeline = pickle.load(f)
+
+    preprocessing, estimator = pipeline[:-1], pipeline[-1]
+
+    # The indicators need the earlier windows for their warm-up, so we transform them all
+    features = preprocessing.transform(X)
+
+    new_features, new_target = features[first_new_row:], y[first_new_row:]
+    new_error = mean_absolute_error(new_target, estimator.predict(new_features))
+
+    logger.info(f"M.A.E on the {len(new_features)} new window(s): {new_error}")
+
+    if needs_full_retrain(metadata=metadata, new_error=new_error):
+
+        logger.info("Running a full retrain")
+        train(X=X, y=y, model=model, tune_hyperparameters=True, tuning_trials=tuning_trials, pair=pair, dates=dates)
+
+        return
+
+    if isinstance(estimator, Lasso):
+
+        estimator.set_params(warm_start=True)
+        estimator.fit(features, y)
+
+    else:
+
+        window_start = max(0, min(first_new_row, len(X) - settings.incremental_window_rows))
+        recent_features, recent_target = features[window_start:], y[window_start:]
+
+        estimator.set_params(n_estimators=settings.incremental_trees)
+
+        if isinstance(estimator, LGBMRegressor):
+            estimator.fit(recent_features, recent_target, init_model=estimator.booster_)
+
+        elif isinstance(estimator, XGBRegressor):
+            estimator.fit(recent_features, recent_target, xgb_model=estimator.get_booster())
+
+        else:
+            raise NotImplementedError("Incremental retraining has not been implemented for this model.")
+
+    # Keep the compiled model that the inference pipeline serves in step with the pickle
+    # (if it fails its check, there is no compiled model, and the pickle is served instead)
+    if isinstance(estimator, Lasso):
+
+        export_compiled_model(
+            pipeline=pipeline,
+            X=X.tail(settings.incremental_window_rows),
+            path=MODELS_DIR/f"{get_tuned_model_name(model=model, pair=pair)}.npz"
+        )
+
+    logger.info(f"Saving the updated {model} model to disk")
+
+    with open(model_path, "wb") as f:
+
+        pickle.dump(pipeline, f)
+
+    save_training_metadata(
+        model=model,
+        trained_rows=len(X),
+        test_error=metadata["test_error"],
+        full_retrain_date=metadata["full_retrain_date"],
+        pair=pair,
+        last_trained_date=dates.iloc[-1]
+    )
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser()
+
+    parser.add_argument("--model", type=str, default="lasso")
+    parser.add_argument("--tuning_trials", type=int, default=10)
+
+    args = parser.parse_args()
+
+    logger.info("Generating features and targets")
+
+    ohlc_data = update_ohlc()
+
+    features, target = transform_ts_data_into_features_and_target(
+        original_data=ohlc_data
+    )
+
+    retrain_incrementally(
+        X=features, 
+        y=target, 
+        dates=get_target_dates(original_data=ohlc_data), 
+        model=args.model, 
+        tuning_trials=args.tuning_trials
+    )
@@ -1,23 +1,28 @@
+import json
 import pickle
+from pathlib import Path
+from datetime import datetime
 from typing import Optional, Callable
 
+import numpy as np
 import pandas as pd 
 from argparse import ArgumentParser
 
-from comet_ml import Experiment
-
 from xgboost import XGBRegressor  
 from lightgbm import LGBMRegressor
 
 from sklearn.linear_model import Lasso
 from sklearn.metrics import mean_absolute_error
-from sklearn.pipeline import make_pipeline
+from sklearn.pipeline import Pipeline, make_pipeline
 
-from src.config import settings
 from src.paths import MODELS_DIR
 from src.logger import get_console_logger
+from src.inference_pipeline.compiled_model import CompiledLinearModel, get_pipeline_steps
+from src.feature_pipeline.feature_engineering import FeatureAssembler
 from src.training_pipeline.hyperparameter_tuning import optimise_hyperparameters
-from src.feature_pipeline.data_transformations import transform_ts_data_into_features_and_target, get_preprocessing_pipeline
+from src.training_pipeline.experiment_tracking import Tracker
+from src.training_pipeline.shared_features import SharedFeatures
+from src.feature_pipeline.data_transformations import transform_ts_data_into_features_and_target, get_preprocessing_pipeline, get_target_dates
 from src.feature_pipeline.data_extraction import update_ohlc
 
 
@@ -54,36 +59,178 @@ def get_model(model: str) -> Callable:
         raise NotImplementedError("The model that you have requested has not been implemented.")
 
 
+def get_tuned_model_name(model: str, pair: Optional[str] = None) -> str:
+    
+    """
+    Returns:
+        str: the name of the saved tuned model's files. Models of pairs other than the 
+             default one have the pair in their names, so that they don't overwrite it.
+    """
+    
+    return f"Tuned {model} model" if pair is None else f"Tuned {pair} {model} model"
+
+
+def save_training_metadata(
+    model: str, 
+    trained_rows: int, 
+    test_error: float, 
+    full_retrain_date: str,
+    pair: Optional[str] = None,
+    last_trained_date: Optional[str] = None
+) -> None:
+    
+    """
+    Record what the saved tuned model has been trained on, so that it can later be 
+    brought up to date incrementally (see incremental_training.py).
+
+    Args:
+        trained_rows: the number of rows of features that the model has been fitted on.
+        test_error: the test error of the last full retrain.
+        full_retrain_date: the date of the last full retrain (with tuning).
+        last_trained_date: the date of the target of the last window that the model has
+                           been fitted on. Any windows with later targets are new to it.
+    """
+    
+    metadata = {
+        "trained_rows": trained_rows, 
+        "test_error": test_error, 
+        "full_retrain_date": full_retrain_date,
+        "last_trained_date": last_trained_date
+    }
+    
+    with open(MODELS_DIR/f"{get_tuned_model_name(model=model, pair=pair)}.json", "w") as f:
+        
+        json.dump(metadata, f)
+        
+
+def load_training_metadata(model: str, pair: Optional[str] = None) -> Optional[dict]:
+    
+    path = MODELS_DIR/f"{get_tuned_model_name(model=model, pair=pair)}.json"
+    
+    if not path.exists():
+        return None
+    
+    with open(path, "r") as f:
+        
+        return json.load(f)
+
+
+def compile_pipeline(pipeline: Pipeline, input_columns: list) -> CompiledLinearModel:
+    
+    """
+    Reduce a fitted pipeline (FeatureAssembler, followed by Lasso) to the coefficients, 
+    intercept and feature engineering parameters that CompiledLinearModel needs.
+
+    Raises:
+        NotImplementedError: if the pipeline has any other steps, or another kind of model.
+    """
+    
+    *transformers, estimator = get_pipeline_steps(pipeline=pipeline)
+    
+    if not isinstance(estimator, Lasso) or len(transformers) != 1 or not isinstance(transformers[0], FeatureAssembler):
+        raise NotImplementedError("Only pipelines of a FeatureAssembler and a Lasso model can be compiled.")
+    
+    assembler = transformers[0]
+    
+    return CompiledLinearModel(
+        coefficients=estimator.coef_,
+        intercept=estimator.intercept_,
+        input_columns=input_columns,
+        rsi_length=assembler.rsi_length,
+        ema_length=assembler.ema_length,
+        percentage_change_days=assembler.percentage_change_days
+    )
+
+
+def export_compiled_model(pipeline: Pipeline, X: pd.DataFrame, path: Path, rows_to_check: int = 20) -> bool:
+    
+    """
+    Compile the pipeline (see compile_pipeline), check that the compiled model makes the 
+    same predictions as the pipeline, and save it for the inference pipeline. We check
+    the predictions on X as a whole (consecutive windows), on X in reverse (windows that 
+    are not consecutive, for which the indicators are computed differently), and on the 
+    last few windows one at a time (as they usually arrive in requests).
+    
+    Any earlier compiled model at the path is removed first, so that it cannot outlive 
+    the pipeline that it was compiled from. If the predictions differ, we only log a 
+    warning, as the inference pipeline serves the pickled pipeline when there is no 
+    compiled model (and a failed check should never cost us the model that was trained).
+
+    Returns:
+        bool: whether the compiled model was saved.
+    """
+    
+    path.unlink(missing_ok=True)
+    
+    compiled_model = compile_pipeline(pipeline=pipeline, input_columns=list(X.columns))
+    
+    batches = [X, X[::-1]] + [X[i:i + 1] for i in range(max(0, len(X) - rows_to_check), len(X))]
+    
+    for batch in batches:
+        
+        expected = pipeline.predict(batch)
+        predictions = compiled_model.predict(batch.to_numpy())
+        
+        if not np.allclose(predictions, expected, rtol=1e-5, atol=1e-6):
+            
+            largest_difference = np.max(np.abs(predictions - expected))
+            
+            logger.warning(
+                f"Not saving the compiled model, as its predictions differ from the pipeline's by up to "
+                f"{largest_difference}. The pipeline will be served instead."
+            )
+            
+            return False
+    
+    compiled_model.save(path=path)
+    
+    logger.info(f"Saved the compiled model, which matches the pipeline on {len(batches)} batches, to {path}")
+    
+    return True
+
+
 def train(
     X: pd.DataFrame,
     y: pd.Series,
     model: str,
     tune_hyperparameters: Optional[bool] = True,
-    tuning_trials: Optional[int] = 10
-) -> None:
+    tuning_trials: Optional[int] = 10,
+    pair: Optional[str] = None,
+    shared_features: Optional[SharedFeatures] = None,
+    dates: Optional[pd.Series] = None,
+    thread_budget: Optional[int] = None
+) -> Optional[float]:
     
     """
     Perform a train-test split using the features "X", and target "y", 
     and train a selected model, with or without prior hyperparameter
     tuning.
     
+    If X and y have already been written as shared features (as the orchestrator does),
+    the tuning trials read their training rows from those files, rather than from a 
+    copy of their own. The dates of the targets (see get_target_dates), if given, are 
+    recorded with the model, so that it can later be updated with the windows after them.
+    The tuning uses no more than thread_budget threads, if given (see get_thread_budget).
+    
     Then log 
     
+    Returns:
+        Optional[float]: the test error of the tuned model (None for untuned models)
+    
     Credit to Pau Labarta Bajo for nearly all the code in this module.
     
     """
     
     model_fn = get_model(model)
     
-    # Log an experimental run of said model 
-    experiment = Experiment(
-        api_key=settings.comet_api_key,
-        workspace=settings.comet_workspace,
-        project_name = settings.comet_project_name
-    )
+    # Log an experimental run of said model (in the background, so that training never waits on the tracker)
+    experiment = Tracker()
      
     experiment.add_tag(model)
     
+    if pair is not None:
+        experiment.add_tag(pair)
+    
     # Set up a train-test split that will be used after the model has been optimised
     train_sample_size = int(0.9*len(X))
     X_train, X_test = X[:train_sample_size], X[train_sample_size:]
@@ -97,14 +244,33 @@ def train(
         # Optimise the hyperparameters
         logger.info("Finding optimal values of hyperparameters with cross-validation")
         
-        best_preprocessing_hyperparameters, best_model_hyperparameters = \
-            optimise_hyperparameters(
-                model_fn=model_fn, 
-                tuning_trials = tuning_trials, 
-                X=X_train,
-                y = y_train, 
-                experiment=experiment
-            )
+        # Write the training data once, for all the tuning trials (and workers) to share
+        owns_shared_features = shared_features is None
+        
+        if owns_shared_features:
+            shared_training_features = SharedFeatures.write(X=X_train, y=y_train)
+        
+        else:
+            shared_training_features = shared_features.head(rows=train_sample_size)
+        
+        try:
+            
+            best_preprocessing_hyperparameters, best_model_hyperparameters = \
+                optimise_hyperparameters(
+                    model_fn=model_fn, 
+                    tuning_trials = tuning_trials, 
+                    X=X_train,
+                    y = y_train, 
+                    experiment=experiment,
+                    shared_features=shared_training_features,
+                    pair=pair,
+                    thread_budget=thread_budget
+                )
+        
+        finally:
+            
+            if owns_shared_features:
+                shared_training_features.remove()
             
         logger.info(f"Best hyperparameters from preprocessing: {best_preprocessing_hyperparameters}")
         logger.info(f"Best model hyperparameters: {best_model_hyperparameters}")
@@ -129,15 +295,45 @@ def train(
         
         logger.info(f"Saving tuned {model} model to disk")
         
-        # Save model locally
-        with open(MODELS_DIR/f"Tuned {model} model.pkl", "wb") as f:
+        model_path = MODELS_DIR/f"{get_tuned_model_name(model=model, pair=pair)}.pkl"
+        
+        try:
             
-            pickle.dump(pipeline, f)
+            # The inference pipeline serves Lasso models without sklearn (see compiled_model.py),
+            # or the pickle below if the compiled model fails its check.
+            if model_fn is Lasso:
+                
+                export_compiled_model(
+                    pipeline=pipeline, 
+                    X=X_test, 
+                    path=MODELS_DIR/f"{get_tuned_model_name(model=model, pair=pair)}.npz"
+                )
+            
+            # Save model locally
+            with open(model_path, "wb") as f:
+                
+                pickle.dump(pipeline, f)
+            
+            save_training_metadata(
+                model=model, 
+                trained_rows=len(X_train), 
+                test_error=test_error, 
+                full_retrain_date=datetime.today().strftime("%Y-%m-%d"),
+                pair=pair,
+                last_trained_date=dates.iloc[train_sample_size - 1] if dates is not None else None
+            )
+            
+            # Log model in CometML's model registry
+            experiment.log_model(
+                model, str(model_path)
+            )
         
-        # Log model in CometML's model registry
-        experiment.log_model(
-            model, str(MODELS_DIR/f"Tuned {model} model.pkl")
-        )
+        finally:
+            
+            # The uploads finish in the background, so that the job doesn't wait on the tracker
+            experiment.end(wait=False)
+        
+        return test_error
         
     else:
         
@@ -154,6 +350,8 @@ def train(
             
             pickle.dump(pipeline, f)
         
+        experiment.end(wait=False)
+        
 
 if __name__ == "__main__":
     
@@ -169,14 +367,19 @@ if __name__ == "__main__":
     
     logger.info("Generating features and targets")
     
+    ohlc_data = update_ohlc()
+    
     features, target = transform_ts_data_into_features_and_target(
-            original_data=update_ohlc()
+            original_data=ohlc_data
         )
+    
+    dates = get_target_dates(original_data=ohlc_data)
 
     if args.sample_size is not None:
         
         features = features.head(args.sample_size)
         target = target.head(args.sample_size)
+        dates = dates.head(args.sample_size)
         
     logger.info("Training the model")
     
@@ -185,5 +388,6 @@ if __name__ == "__main__":
         y=target,
         model=args.model,
         tune_hyperparameters=args.tune_hyperparameters,
-        tuning_trials=args.tuning_trials
+        tuning_trials=args.tuning_trials,
+        dates=dates
     )
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import pandas as pd
+
+from pathlib import Path
+from itertools import product
+from argparse import ArgumentParser
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from threadpoolctl import threadpool_limits
+
+from src.paths import MODELS_DIR
+from src.logger import get_console_logger
+from src.training_pipeline.shared_features import SharedFeatures
+from src.feature_pipeline.data_extraction import update_ohlc
+from src.feature_pipeline.data_transformations import transform_ts_data_into_features_and_target, get_target_dates
+
+
+logger = get_console_logger()
+
+# The pair that the deployed model forecasts. Its models keep their usual file names.
+DEFAULT_PAIR = "GBPGHS"
+
+
+def build_features_for_pairs(pairs: List[str]) -> Dict[str, SharedFeatures]:
+
+    """
+    Extract the data, and build the features and targets, of each pair just once, and
+    write them where every job that trains a model of the pair can memory-map them.
+    """
+
+    shared_features = {}
+
+    for pair in pairs:
+
+        logger.info(f"Building the features of {pair}")
+
+        ohlc_data = update_ohlc(base_currency=pair[:3], target_currency=pair[3:])
+
+        features, target = transform_ts_data_into_features_and_target(
+            original_data=ohlc_data,
+            base_currency=pair[:3],
+            target_currency=pair[3:]
+        )
+
+        shared_features[pair] = SharedFeatures.write(
+            X=features, y=target, name=f"{pair}_{os.getpid()}", dates=get_target_dates(original_data=ohlc_data)
+        )
+
+    return shared_features
+
+
+def run_training_job(
+    pair: str,
+    model: str,
+    shared_features: SharedFeatures,
+    tuning_trials: int,
+    thread_budget: int
+) -> dict:
+
+    """
+    Train one model of one pair in a worker process, using no more than thread_budget
+    threads: the budget is shared out between the tuning workers (for their folds and
+    models), and caps the OpenMP and BLAS thread pools of the final fit. The tuning 
+    reads the pair's shared features, rather than writing a copy of its own.
+
+    Returns:
+        dict: the job's entry in the summary.
+    """
+
+    # Imported here, so that the parent process doesn't have to load the models' libraries
+    from src.training_pipeline.model_training import train
+
+    start = time.perf_counter()
+
+    try:
+
+        X, y = shared_features.get_all()
+
+        with threadpool_limits(limits=thread_budget):
+
+            test_error = train(
+                X=X,
+                y=y,
+                model=model,
+                tune_hyperparameters=True,
+                tuning_trials=tuning_trials,
+                pair=None if pair == DEFAULT_PAIR else pair,
+                shared_features=shared_features,
+                dates=shared_features.get_dates(),
+                thread_budget=thread_budget
+            )
+
+        status, error = "succeeded", None
+
+    except Exception as exception:
+
+        logger.exception(f"Training {model} on {pair} failed")
+        test_error, status, error = None, "failed", repr(exception)
+
+    return {
+        "pair": pair,
+        "model": model,
+        "status": status,
+        "wall_time_seconds": time.perf_counter() - start,
+        "test_mae": test_error,
+        "thread_budget": thread_budget,
+        "error": error
+    }
+
+
+def orchestrate(
+    pairs: List[str],
+    models: List[str],
+    tuning_trials: int = 10,
+    cpu_budget: Optional[int] = None,
+    max_parallel_jobs: Optional[int] = None,
+    summary_path: Path = MODELS_DIR/"training_summary.json"
+) -> pd.DataFrame:
+
+    """
+    Train every model on every pair, running the jobs on a pool of processes.
+
+    The jobs share out the CPU budget (all cores, by default): with n jobs running at a
+    time, each one gets cpu_budget // n threads, so that the jobs never fight over the
+    cores. Data extraction and feature building happen once per pair, before any jobs
+    start.
+
+    Returns:
+        pd.DataFrame: the summary, with the wall time and test M.A.E of each job, which
+                      is also written to summary_path.
+    """
+
+    cpu_budget = cpu_budget if cpu_budget is not None else (os.cpu_count() or 1)
+    jobs = list(product(pairs, models))
+
+    parallel_jobs = min(len(jobs), max_parallel_jobs or cpu_budget, cpu_budget)
+    thread_budget = max(1, cpu_budget//parallel_jobs)
+
+    logger.info(
+        f"Running {len(jobs)} job(s), {parallel_jobs} at a time, with {thread_budget} thread(s) each"
+    )
+
+    shared_features = build_features_for_pairs(pairs=pairs)
+    start = time.perf_counter()
+
+    try:
+
+        with ProcessPoolExecutor(max_workers=parallel_jobs, mp_context=get_context("spawn")) as executor:
+
+            futures = [
+                executor.submit(
+                    run_training_job,
+                    pair=pair,
+                    model=model,
+                    shared_features=shared_features[pair],
+                    tuning_trials=tuning_trials,
+                    thread_budget=thread_budget
+                )
+                for pair, model in jobs
+            ]
+
+            results = [future.result() for future in futures]
+
+    finally:
+
+        for features in shared_features.values():
+            features.remove()
+
+    summary = pd.DataFrame(results)
+
+    logger.info(f"All jobs finished in {time.perf_counter() - start:.1f}s\n{summary.to_string(index=False)}")
+
+    with open(summary_path, "w") as file:
+        json.dump(results, file, indent=2)
+
+    return summary
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser()
+
+    parser.add_argument("--pairs", type=str, nargs="+", default=[DEFAULT_PAIR])
+    parser.add_argument("--models", type=str, nargs="+", default=["lasso", "xgboost", "lightgbm"])
+    parser.add_argument("--tuning_trials", type=int, default=10)
+    parser.add_argument("--cpu_budget", type=int, default=None)
+    parser.add_argument("--max_parallel_jobs", type=int, default=None)
+
+    args = parser.parse_args()
+
+    orchestrate(
+        pairs=args.pairs,
+        models=args.models,
+        tuning_trials=args.tuning_trials,
+        cpu_budget=args.cpu_budget,
+        max_parallel_jobs=args.max_parallel_jobs
+    )
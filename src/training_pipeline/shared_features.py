@@ -0,0 +1,179 @@
+import json
+import uuid
+import shutil
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from typing import Optional, Tuple
+
+from src.paths import SHARED_FEATURES_DIR
+from src.logger import get_console_logger
+
+
+logger = get_console_logger()
+
+
+class SharedFeatures:
+
+    """
+    The features and targets of a training run, written once to .npy files that every
+    tuning worker (thread or process) memory-maps, rather than holding (and pickling)
+    its own copy of them.
+
+    TimeSeriesSplit only ever makes folds of consecutive rows, so each fold is taken as a
+    slice of the memory-mapped arrays. These slices are views, so no rows are copied
+    until the preprocessing makes its (new) block of features. Only the paths are
+    pickled, so sending a SharedFeatures object to a worker process costs next to nothing,
+    and the operating system keeps a single copy of the data in its page cache however
+    many workers attach to it.
+    """
+
+    def __init__(self, directory: Path, rows: Optional[int] = None):
+
+        self.directory = Path(directory)
+        self.rows = rows
+
+        with open(self.directory/"metadata.json", "r") as file:
+            self.metadata = json.load(file)
+
+        self.features = None
+        self.targets = None
+
+    @classmethod
+    def write(
+        cls,
+        X: pd.DataFrame,
+        y: pd.Series|pd.DataFrame,
+        name: Optional[str] = None,
+        dates: Optional[pd.Series] = None
+    ) -> "SharedFeatures":
+
+        """
+        Write the features and targets to a directory of their own under
+        SHARED_FEATURES_DIR. The features are written as a single float32 array (the
+        dtype of the windows of closing rates).
+
+        Args:
+            name: the name of the directory. By default, a new one is made for each
+                  call, so that concurrent training runs don't overwrite each other.
+            dates: the date of the target of each row (see get_target_dates), if known.
+
+        Returns:
+            SharedFeatures: the written features, ready to be attached to.
+        """
+
+        directory = SHARED_FEATURES_DIR/(name if name is not None else uuid.uuid4().hex)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        np.save(directory/"features.npy", X.to_numpy(dtype=np.float32))
+        np.save(directory/"targets.npy", y.to_numpy(dtype=np.float64))
+
+        if dates is not None:
+            np.save(directory/"dates.npy", pd.to_datetime(dates).to_numpy(dtype="datetime64[D]"))
+
+        metadata = {
+            "columns": list(X.columns),
+            "target_columns": list(y.columns) if isinstance(y, pd.DataFrame) else None,
+            "target_name": y.name if isinstance(y, pd.Series) else None,
+            "index_start": int(X.index[0]) if isinstance(X.index, pd.RangeIndex) and len(X) > 0 else 0
+        }
+
+        with open(directory/"metadata.json", "w") as file:
+            json.dump(metadata, file)
+
+        logger.info(f"Wrote {len(X)} rows of shared features to {directory}")
+
+        return cls(directory=directory)
+
+    def attach(self) -> "SharedFeatures":
+
+        """ Memory-map the arrays (read-only), if this has not been done already """
+
+        if self.features is None:
+
+            self.features = np.load(self.directory/"features.npy", mmap_mode="r")[:self.rows]
+            self.targets = np.load(self.directory/"targets.npy", mmap_mode="r")[:self.rows]
+
+        return self
+
+    def head(self, rows: int) -> "SharedFeatures":
+
+        """
+        Returns:
+            SharedFeatures: the first "rows" rows of the same files (such as the training
+                            rows of a train-test split), without writing them again.
+                            Removing it removes the files of the whole.
+        """
+
+        return SharedFeatures(directory=self.directory, rows=rows)
+
+    def __len__(self) -> int:
+
+        return len(self.attach().features)
+
+    def __getstate__(self) -> dict:
+
+        # Workers attach to the files themselves, so the arrays are never pickled
+        return {"directory": self.directory, "rows": self.rows, "metadata": self.metadata}
+
+    def __setstate__(self, state: dict) -> None:
+
+        self.__dict__.update(state)
+        self.features = None
+        self.targets = None
+
+    def get_fold(self, start: int, stop: int) -> Tuple[pd.DataFrame, pd.Series|pd.DataFrame]:
+
+        """
+        Args:
+            start: the position of the first row of the fold.
+            stop: the position after the last row of the fold.
+
+        Returns:
+            Tuple[pd.DataFrame, pd.Series|pd.DataFrame]: the features and targets of the
+                                                         fold, as views of the files.
+        """
+
+        self.attach()
+
+        index_start = self.metadata["index_start"]
+        index = pd.RangeIndex(start=index_start + start, stop=index_start + stop)
+
+        X = pd.DataFrame(self.features[start:stop], columns=self.metadata["columns"], index=index, copy=False)
+
+        if self.metadata["target_columns"] is not None:
+            y = pd.DataFrame(self.targets[start:stop], columns=self.metadata["target_columns"], index=index, copy=False)
+
+        else:
+            y = pd.Series(self.targets[start:stop], name=self.metadata["target_name"], index=index, copy=False)
+
+        return X, y
+
+    def get_all(self) -> Tuple[pd.DataFrame, pd.Series|pd.DataFrame]:
+
+        return self.get_fold(start=0, stop=len(self))
+
+    def get_dates(self) -> Optional[pd.Series]:
+
+        """
+        Returns:
+            Optional[pd.Series]: the date of the target of each row (as "%Y-%m-%d" strings),
+                                 or None if no dates were written.
+        """
+
+        if not (self.directory/"dates.npy").exists():
+            return None
+
+        dates = np.load(self.directory/"dates.npy")[:self.rows]
+
+        return pd.Series(np.datetime_as_string(dates, unit="D"), name="Date")
+
+    def remove(self) -> None:
+
+        """ Delete the files, once no worker needs them any more """
+
+        self.features = None
+        self.targets = None
+
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sklearn.pipeline import make_pipeline
+from lightgbm import LGBMRegressor
+from xgboost import XGBRegressor
+
+from src.feature_pipeline.synthetic_data import generate_pair_ohlc
+from src.feature_pipeline.data_transformations import transform_ts_data_into_features_and_target, get_preprocessing_pipeline
+from src.inference_pipeline.booster_model import BoosterModel
+
+
+@pytest.fixture(scope="module")
+def features_and_target():
+
+    ohlc = generate_pair_ohlc(pair="GBPGHS", dates=pd.date_range(start="2023-01-01", end="2024-06-30", freq="B"))
+
+    features, target = transform_ts_data_into_features_and_target(original_data=ohlc)
+
+    return features, target.iloc[:, 0]
+
+
+def get_batches(X: pd.DataFrame) -> dict:
+
+    """ Consecutive windows, the same windows shuffled, and single windows (as requests usually send them) """
+
+    return {
+        "consecutive": [X],
+        "shuffled": [X.sample(frac=1, random_state=0)],
+        "single": [X[i:i + 1] for i in range(len(X) - 5, len(X))]
+    }
+
+
+@pytest.mark.parametrize("batch_kind", ["consecutive", "shuffled", "single"])
+@pytest.mark.parametrize("model_fn", [LGBMRegressor, XGBRegressor])
+def test_booster_model_matches_pipeline(features_and_target, model_fn, batch_kind):
+
+    X, y = features_and_target
+
+    hyperparameters = {"verbose": -1} if model_fn is LGBMRegressor else {}
+
+    pipeline = make_pipeline(get_preprocessing_pipeline(), model_fn(n_estimators=20, **hyperparameters))
+    pipeline.fit(X[:300], y[:300])
+
+    booster_model = BoosterModel.from_pipeline(pipeline=pipeline, threads=1)
+
+    for batch in get_batches(X[300:])[batch_kind]:
+
+        np.testing.assert_allclose(booster_model.predict(batch.to_numpy()), pipeline.predict(batch), rtol=1e-5, atol=1e-6)
+
+        records = batch.to_dict(orient="records")
+        np.testing.assert_allclose(booster_model.predict_records(records), pipeline.predict(batch), rtol=1e-5, atol=1e-6)
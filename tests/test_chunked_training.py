@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from sklearn.linear_model import Lasso
+from sklearn.metrics import mean_absolute_error
+
+from src.feature_pipeline.synthetic_data import generate_pair_ohlc
+from src.feature_pipeline.data_transformations import get_preprocessing_pipeline
+from src.training_pipeline import chunked_training
+from src.training_pipeline.chunked_training import (
+    ChunkReader, RelativeLinearModel, write_feature_dataset, train_lasso_chunked, train_xgboost_chunked
+)
+
+
+PAIRS = ["GBPGHS", "EURUSD", "USDGHS"]
+
+
+def write_pooled_features(monkeypatch, path) -> tuple:
+
+    """ Write the pooled windows of a few synthetic pairs, in row groups of 1000 """
+
+    def update_ohlc(base_currency: str, target_currency: str) -> pd.DataFrame:
+
+        return generate_pair_ohlc(
+            pair=f"{base_currency}{target_currency}", dates=pd.date_range(start="2019-01-01", end="2023-12-31", freq="B")
+        )
+
+    monkeypatch.setattr(chunked_training, "update_ohlc", update_ohlc)
+
+    return write_feature_dataset(pairs=PAIRS, path=path, rows_per_group=1000)
+
+
+def test_chunked_lasso_is_close_to_lasso_in_memory(monkeypatch, tmp_path):
+
+    train_path, test_path = write_pooled_features(monkeypatch=monkeypatch, path=tmp_path/"features")
+
+    reader = ChunkReader(path=train_path, preprocessing=get_preprocessing_pipeline())
+    chunked_model = train_lasso_chunked(reader=reader)
+
+    X_train = np.concatenate([features for features, _ in reader])
+    y_train = np.concatenate([y for _, y in reader])
+
+    # Lasso, fitted to all the same (standardised, relative) features and returns at once
+    in_memory_model = RelativeLinearModel(feature_columns=reader.feature_columns, alpha=0.001, eta0=0.001)
+    in_memory_model.partial_fit_scalers(features=X_train, y=y_train)
+
+    in_memory_model.model = Lasso(alpha=0.001, max_iter=10_000).fit(
+        in_memory_model.feature_scaler.transform(in_memory_model.to_relative(X_train)),
+        in_memory_model.target_scaler.transform(in_memory_model.to_returns(X_train, y_train)).ravel()
+    )
+
+    test_reader = ChunkReader(path=test_path, preprocessing=get_preprocessing_pipeline())
+
+    X_test = np.concatenate([features for features, _ in test_reader])
+    y_test = np.concatenate([y for _, y in test_reader])
+
+    chunked_error = mean_absolute_error(y_test, chunked_model.predict(X_test))
+    in_memory_error = mean_absolute_error(y_test, in_memory_model.predict(X_test))
+
+    assert chunked_error <= 1.05*in_memory_error
+
+
+def test_xgboost_cache_is_removed(monkeypatch, tmp_path):
+
+    monkeypatch.setattr(chunked_training, "TRAINING_DATA_DIR", tmp_path/"training")
+
+    train_path, _ = write_pooled_features(monkeypatch=monkeypatch, path=tmp_path/"features")
+
+    reader = ChunkReader(path=train_path, preprocessing=get_preprocessing_pipeline())
+    booster = train_xgboost_chunked(reader=reader, num_boost_round=5)
+
+    assert booster.num_boosted_rounds() == 5
+    assert list((tmp_path/"training").iterdir()) == []
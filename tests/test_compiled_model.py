@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sklearn.linear_model import Lasso
+from sklearn.pipeline import make_pipeline
+
+from src.feature_pipeline.synthetic_data import generate_pair_ohlc
+from src.feature_pipeline.data_transformations import transform_ts_data_into_features_and_target, get_preprocessing_pipeline
+from src.inference_pipeline.compiled_model import CompiledLinearModel
+from src.training_pipeline import model_training
+from src.training_pipeline.model_training import compile_pipeline, export_compiled_model
+
+
+@pytest.fixture(scope="module")
+def features_and_target():
+
+    ohlc = generate_pair_ohlc(pair="GBPGHS", dates=pd.date_range(start="2023-01-01", end="2024-06-30", freq="B"))
+
+    features, target = transform_ts_data_into_features_and_target(original_data=ohlc)
+
+    return features, target.iloc[:, 0]
+
+
+def get_batches(X: pd.DataFrame) -> dict:
+
+    """ Consecutive windows, the same windows shuffled, and single windows (as requests usually send them) """
+
+    return {
+        "consecutive": [X],
+        "shuffled": [X.sample(frac=1, random_state=0)],
+        "single": [X[i:i + 1] for i in range(len(X) - 5, len(X))]
+    }
+
+
+@pytest.mark.parametrize("batch_kind", ["consecutive", "shuffled", "single"])
+def test_compiled_linear_model_matches_pipeline(features_and_target, batch_kind, tmp_path):
+
+    X, y = features_and_target
+
+    pipeline = make_pipeline(get_preprocessing_pipeline(rsi_length=10, ema_length=20), Lasso(alpha=0.001, max_iter=5000))
+    pipeline.fit(X[:300], y[:300])
+
+    compiled_model = compile_pipeline(pipeline=pipeline, input_columns=list(X.columns))
+
+    # The saved arrays must make the same model
+    compiled_model.save(path=tmp_path/"model.npz")
+    compiled_model = CompiledLinearModel.load(path=tmp_path/"model.npz")
+
+    for batch in get_batches(X[300:])[batch_kind]:
+
+        np.testing.assert_allclose(
+            compiled_model.predict(batch.to_numpy()), pipeline.predict(batch), rtol=1e-5, atol=1e-6
+        )
+
+
+def test_mismatched_compiled_model_is_not_saved(features_and_target, monkeypatch, tmp_path):
+
+    X, y = features_and_target
+
+    pipeline = make_pipeline(get_preprocessing_pipeline(), Lasso(alpha=0.001, max_iter=5000))
+    pipeline.fit(X[:300], y[:300])
+
+    class WrongModel:
+
+        def predict(self, features: np.ndarray) -> np.ndarray:
+
+            return np.zeros(len(features))
+
+    monkeypatch.setattr(model_training, "compile_pipeline", lambda pipeline, input_columns: WrongModel())
+
+    # A compiled model from an earlier run, which must not outlive its pipeline
+    (tmp_path/"model.npz").write_bytes(b"stale")
+
+    assert not export_compiled_model(pipeline=pipeline, X=X[300:], path=tmp_path/"model.npz")
+    assert not (tmp_path/"model.npz").exists()
@@ -0,0 +1,84 @@
+import json
+import pandas as pd
+import pytest
+
+from types import SimpleNamespace
+from datetime import datetime
+
+from src.config import settings
+from src.feature_pipeline import data_extraction
+from src.feature_pipeline.ohlc_store import OHLCStore
+from src.feature_pipeline.response_cache import ResponseCache
+
+
+EMPTY_RESPONSE = json.dumps({"status": "OK", "queryCount": 0, "resultsCount": 0, "adjusted": True}).encode()
+
+
+def make_response(closing_rate: float) -> bytes:
+
+    results = [{"T": "C:GBPGHS", "o": closing_rate, "h": closing_rate, "l": closing_rate, "c": closing_rate}]
+
+    return json.dumps({"status": "OK", "resultsCount": 1, "results": results}).encode()
+
+
+def make_record(date: str, closing_rate: float) -> dict:
+
+    return {
+        "Date": date,
+        "Opening_rate_GBPGHS": closing_rate,
+        "Peak_rate_GBPGHS": closing_rate,
+        "Lowest_rate_GBPGHS": closing_rate,
+        "Closing_rate_GBPGHS": closing_rate
+    }
+
+
+@pytest.fixture
+def polygon(monkeypatch, tmp_path):
+
+    """ A store and a response cache of our own, and a Polygon that serves whatever is in "responses" """
+
+    responses = {}
+
+    def get_with_retries(url: str, params: dict = None):
+
+        return SimpleNamespace(content=responses[url.rsplit("/", 1)[-1]])
+
+    monkeypatch.setattr(settings, "use_synthetic_data", False)
+    monkeypatch.setattr(settings, "polygon_download_mode", "grouped")
+    monkeypatch.setattr(data_extraction, "get_with_retries", get_with_retries)
+    monkeypatch.setattr(data_extraction, "response_cache", ResponseCache(cache_dir=tmp_path/"responses"))
+    monkeypatch.setattr(data_extraction, "ohlc_store", OHLCStore(store_dir=tmp_path/"store"))
+
+    (tmp_path/"responses").mkdir()
+
+    return responses
+
+
+def test_empty_responses_are_not_cached(polygon):
+
+    polygon["2024-03-05"] = EMPTY_RESPONSE
+
+    assert data_extraction.get_raw_api_response(date=datetime(2024, 3, 5)) == EMPTY_RESPONSE
+    assert data_extraction.response_cache.get(date=datetime(2024, 3, 5)) is None
+
+    polygon["2024-03-05"] = make_response(closing_rate=15.5)
+
+    assert data_extraction.get_raw_api_response(date=datetime(2024, 3, 5)) == polygon["2024-03-05"]
+    assert data_extraction.response_cache.get(date=datetime(2024, 3, 5)) == polygon["2024-03-05"]
+
+
+def test_gap_is_filled_after_an_empty_cached_response(polygon):
+
+    # An empty response that was cached (before empty responses stopped being cached)
+    data_extraction.response_cache.put(date=datetime(2024, 3, 5), content=EMPTY_RESPONSE)
+    polygon["2024-03-05"] = make_response(closing_rate=15.5)
+
+    data_extraction.ohlc_store.append(
+        pair="GBPGHS",
+        dataframe=pd.DataFrame([make_record("2024-03-04", 15.0), make_record("2024-03-06", 16.0)])
+    )
+
+    filled_data = data_extraction.fill_ohlc_gaps(base_currency="GBP", target_currency="GHS")
+
+    assert filled_data["Date"].tolist() == ["2024-03-04", "2024-03-05", "2024-03-06"]
+    assert filled_data["Closing_rate_GBPGHS"].tolist() == [15.0, 15.5, 16.0]
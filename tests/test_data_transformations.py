@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from src.feature_pipeline.synthetic_data import generate_pair_ohlc
+from src.feature_pipeline.data_transformations import transform_ts_data_into_features_and_target, get_target_dates
+
+
+def test_target_dates_line_up_with_the_targets():
+
+    ohlc = generate_pair_ohlc(pair="GBPGHS", dates=pd.date_range(start="2024-01-01", periods=80, freq="B"))
+
+    # The rows are sorted by date before the windows are made
+    ohlc = ohlc.sample(frac=1, random_state=0)
+
+    _, targets = transform_ts_data_into_features_and_target(original_data=ohlc)
+    dates = get_target_dates(original_data=ohlc)
+
+    closing_rates = ohlc.set_index("Date")["Closing_rate_GBPGHS"].astype(np.float32)
+
+    assert len(dates) == len(targets)
+    np.testing.assert_array_equal(closing_rates.loc[dates].to_numpy(), targets.iloc[:, 0].to_numpy())
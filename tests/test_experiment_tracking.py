@@ -0,0 +1,78 @@
+import gc
+import json
+import time
+import weakref
+import threading
+
+from src.training_pipeline.experiment_tracking import Tracker, LocalFileBackend
+
+
+class SlowUploadBackend(LocalFileBackend):
+
+    """ A local backend whose uploads take as long as we want them to """
+
+    def __init__(self, directory, upload_started: threading.Event, release_upload: threading.Event):
+
+        super().__init__(directory=directory, run_id="run")
+
+        self.upload_started = upload_started
+        self.release_upload = release_upload
+
+    def upload_model(self, name: str, path: str) -> None:
+
+        self.upload_started.set()
+        self.release_upload.wait(timeout=10)
+
+        super().upload_model(name=name, path=path)
+
+
+def read_events(backend: LocalFileBackend) -> list:
+
+    with open(backend.path) as file:
+        return [json.loads(line) for line in file]
+
+
+def test_unused_tracker_is_collected_and_flushed(tmp_path):
+
+    backend = LocalFileBackend(directory=tmp_path, run_id="run")
+
+    tracker = Tracker(backend=backend, flush_interval=60)
+    tracker.add_tag("lasso")
+
+    tracker_ref = weakref.ref(tracker)
+
+    del tracker
+    gc.collect()
+
+    assert tracker_ref() is None
+    assert [event["tag"] for event in read_events(backend)] == ["lasso"]
+
+
+def test_end_without_waiting_returns_before_the_uploads_finish(tmp_path):
+
+    upload_started, release_upload = threading.Event(), threading.Event()
+    backend = SlowUploadBackend(directory=tmp_path, upload_started=upload_started, release_upload=release_upload)
+
+    (tmp_path/"model.pkl").write_bytes(b"model")
+
+    tracker = Tracker(backend=backend, flush_interval=60)
+    tracker.log_metric(name="Test M.A.E", value=0.1)
+    tracker.log_model(name="lasso", path=str(tmp_path/"model.pkl"))
+
+    assert upload_started.wait(timeout=10)
+
+    start = time.perf_counter()
+    tracker.end(wait=False)
+
+    assert time.perf_counter() - start < 1
+    assert not (tmp_path/"run"/"model.pkl").exists()
+
+    release_upload.set()
+
+    closing_threads = [thread for thread in threading.enumerate() if thread.name == "tracker-close"]
+
+    for thread in closing_threads:
+        thread.join(timeout=10)
+
+    assert (tmp_path/"run"/"model.pkl").read_bytes() == b"model"
+    assert [event["type"] for event in read_events(backend)] == ["metric", "model"]
@@ -0,0 +1,43 @@
+import pandas as pd
+
+from multiprocessing import get_context
+
+from src.feature_pipeline.ohlc_store import OHLCStore
+
+
+def append_and_compact(store_dir: str, dates: list) -> None:
+
+    store = OHLCStore(store_dir=store_dir)
+
+    for date in dates:
+
+        store.append(pair="GBPGHS", dataframe=pd.DataFrame({"Date": [date], "Closing_rate_GBPGHS": [1.0]}))
+        store.compact(pair="GBPGHS")
+
+
+def test_concurrent_processes_keep_every_row(tmp_path):
+
+    """ Two processes appending to (and compacting) the same months must not lose each other's rows """
+
+    dates = [str(date.date()) for date in pd.date_range(start="2024-01-01", periods=60, freq="D")]
+
+    context = get_context("spawn")
+    processes = [
+        context.Process(target=append_and_compact, args=(str(tmp_path), dates[start::2])) for start in range(2)
+    ]
+
+    for process in processes:
+        process.start()
+
+    # Reads in this process must never find a part file missing while the others compact
+    store = OHLCStore(store_dir=tmp_path)
+
+    while any(process.is_alive() for process in processes):
+        store.read(pair="GBPGHS")
+
+    for process in processes:
+
+        process.join()
+        assert process.exitcode == 0
+
+    assert store.read(pair="GBPGHS")["Date"].tolist() == dates
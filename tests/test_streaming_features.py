@@ -0,0 +1,26 @@
+import pandas as pd
+import pytest
+
+from src.feature_pipeline import streaming_features
+from src.feature_pipeline.synthetic_data import generate_pair_ohlc
+
+
+def test_short_history_is_saved_without_features(monkeypatch, tmp_path):
+
+    """ Refreshing the state of a pair with fewer closing rates than a window must not fail """
+
+    monkeypatch.setattr(streaming_features, "FEATURE_STATE_DIR", tmp_path)
+
+    rates = generate_pair_ohlc(pair="GBPGHS", dates=pd.date_range(start="2024-01-01", periods=40, freq="B"))
+
+    streaming_features.refresh_saved_streaming_features(rates=rates[:10])
+
+    with pytest.raises(ValueError):
+        streaming_features.get_latest_features()
+
+    # Once there are enough days, the saved state serves the features
+    streaming_features.refresh_saved_streaming_features(rates=rates)
+
+    features = streaming_features.get_latest_features()
+
+    assert features.iloc[0, 29] == pytest.approx(rates["Closing_rate_GBPGHS"].iloc[-1], rel=1e-6)
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+
+from src.feature_pipeline.trading_calendar import get_trading_days, get_closed_trading_days
+
+
+def test_trading_days_leave_out_weekends_and_holidays():
+
+    trading_days = get_trading_days(start_date=datetime(2023, 12, 22), end_date=datetime(2024, 1, 2))
+
+    expected = np.array(["2023-12-22", "2023-12-26", "2023-12-27", "2023-12-28", "2023-12-29", "2024-01-02"], dtype="datetime64[D]")
+
+    np.testing.assert_array_equal(trading_days, expected)
+
+
+def test_only_closed_sessions_are_kept():
+
+    now = pd.Timestamp.now(tz="UTC")
+
+    closed_days = get_closed_trading_days(start_date=now - pd.Timedelta(days=10), end_date=now + pd.Timedelta(days=10))
+    trading_days = get_trading_days(start_date=now - pd.Timedelta(days=10), end_date=now + pd.Timedelta(days=10))
+
+    # Every session ends at 5PM in New York (9PM or 10PM UTC) on its own day
+    assert np.all(closed_days <= np.datetime64(now.date()))
+    assert np.all(np.isin(trading_days[trading_days < np.datetime64(now.date())], closed_days))
+
+    if (now.tz_convert("America/New_York").hour < 17) and np.datetime64(now.date()) in trading_days:
+        assert np.datetime64(now.date()) not in closed_days